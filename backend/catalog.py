@@ -0,0 +1,225 @@
+import os
+import ast
+import json
+import mmap
+import struct
+import sqlite3
+import tempfile
+import numpy as np
+import pandas as pd
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DB_PATH = os.getenv("WORKOUT_DB", os.path.join(BASE_DIR, "workout.db"))
+CATALOG_PATH = os.getenv("WORKOUT_CATALOG", os.path.join(os.path.dirname(DB_PATH), "catalog.bin"))
+
+# File layout: MAGIC, u64 header length, JSON header, then arrays at ALIGN-byte offsets
+MAGIC = b"AURACAT1"
+ALIGN = 64
+
+def _safe_eval(x):
+    try:
+        return ast.literal_eval(x)
+    except:
+        return []
+
+def load_programs(db_path=DB_PATH):
+    """
+    Reads the programs table and drops invalid rows.
+    Adds parsed 'level_list' and 'goal_list' columns.
+    """
+    conn = sqlite3.connect(db_path)
+    df_programs = pd.read_sql("SELECT * FROM programs", conn)
+    conn.close()
+
+    # Filter out invalid programs (numeric titles or too short)
+    # Remove rows where title is purely numeric
+    df_programs = df_programs[~df_programs['title'].astype(str).str.match(r'^\d+$')]
+    # Remove rows where title is suspiciously short
+    df_programs = df_programs[df_programs['title'].astype(str).str.len() >= 3]
+
+    # Parse stringified lists
+    df_programs['level_list'] = df_programs['level'].apply(_safe_eval)
+    df_programs['goal_list'] = df_programs['goal'].apply(_safe_eval)
+    return df_programs.reset_index(drop=True)
+
+def _pack_tags(tag_lists, vocab):
+    index = {tag: i for i, tag in enumerate(vocab)}
+    bits = np.zeros((len(tag_lists), len(vocab)), dtype=np.uint8)
+    for row, tags in enumerate(tag_lists):
+        for tag in tags:
+            bits[row, index[tag]] = 1
+    return np.packbits(bits, axis=1)
+
+def _string_table(values):
+    """
+    Encodes strings as one UTF-8 blob plus (n + 1) offsets into it.
+    """
+    encoded = [str(v).encode("utf-8") if pd.notnull(v) else b"" for v in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.uint64)
+    offsets[1:] = np.cumsum([len(b) for b in encoded])
+    return offsets, np.frombuffer(b"".join(encoded), dtype=np.uint8)
+
+def build_catalog(df_programs, path=CATALOG_PATH):
+    """
+    Writes df_programs (as returned by load_programs) into a compact catalog
+    file. Tags are interned into vocabularies and stored as packed bitsets;
+    text columns are stored as offset + blob tables.
+    The file is replaced atomically, so readers never see a partial catalog.
+    """
+    levels = sorted({item for sublist in df_programs['level_list'] for item in sublist})
+    goals = sorted({item for sublist in df_programs['goal_list'] for item in sublist})
+
+    title_offsets, title_blob = _string_table(df_programs['title'])
+    # Case-folded copy of the titles, for case-insensitive search
+    title_key_offsets, title_key_blob = _string_table(df_programs['title'].astype(str).str.casefold())
+    description_offsets, description_blob = _string_table(df_programs['description'])
+
+    arrays = {
+        "level_bits": _pack_tags(df_programs['level_list'], levels),
+        "goal_bits": _pack_tags(df_programs['goal_list'], goals),
+        "minutes": pd.to_numeric(df_programs['time_per_workout'], errors='coerce').to_numpy(dtype=np.float32),
+        "title_offsets": title_offsets,
+        "title_blob": title_blob,
+        "title_key_offsets": title_key_offsets,
+        "title_key_blob": title_key_blob,
+        "description_offsets": description_offsets,
+        "description_blob": description_blob,
+    }
+
+    # Lay arrays out after the header; offsets are relative to the data section
+    layout = {}
+    data_size = 0
+    for name, arr in arrays.items():
+        data_size = -(-data_size // ALIGN) * ALIGN
+        layout[name] = {"dtype": arr.dtype.str, "shape": list(arr.shape), "offset": data_size}
+        data_size += arr.nbytes
+
+    header = json.dumps({
+        "count": len(df_programs),
+        "levels": levels,
+        "goals": goals,
+        "arrays": layout,
+    }).encode("utf-8")
+    data_start = -(-(len(MAGIC) + 8 + len(header)) // ALIGN) * ALIGN
+
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(MAGIC)
+            f.write(struct.pack("<Q", len(header)))
+            f.write(header)
+            for name, arr in arrays.items():
+                f.write(b"\0" * (data_start + layout[name]["offset"] - f.tell()))
+                f.write(np.ascontiguousarray(arr).tobytes())
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except:
+        os.unlink(tmp_path)
+        raise
+
+class ProgramCatalog:
+    """
+    Read-only, memory-mapped view of a catalog file.
+    Every process that opens the same file shares its pages through the OS
+    page cache instead of holding a private copy of the program table.
+    """
+    def __init__(self, path=CATALOG_PATH):
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if self._mmap[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"Not a program catalog: {path}")
+        (header_len,) = struct.unpack_from("<Q", self._mmap, len(MAGIC))
+        header_start = len(MAGIC) + 8
+        header = json.loads(self._mmap[header_start:header_start + header_len])
+        data_start = -(-(header_start + header_len) // ALIGN) * ALIGN
+
+        self.count = header["count"]
+        self.levels = header["levels"]
+        self.goals = header["goals"]
+
+        arrays = {}
+        for name, spec in header["arrays"].items():
+            dtype = np.dtype(spec["dtype"])
+            shape = tuple(spec["shape"])
+            count = int(np.prod(shape))
+            if count == 0:
+                arrays[name] = np.empty(shape, dtype=dtype)
+                continue
+            arrays[name] = np.frombuffer(
+                self._mmap, dtype=dtype, count=count, offset=data_start + spec["offset"]
+            ).reshape(shape)
+
+        self._level_bits = arrays["level_bits"]
+        self._goal_bits = arrays["goal_bits"]
+        self.minutes = arrays["minutes"]
+        self._title_offsets = arrays["title_offsets"]
+        self._title_key_offsets = arrays["title_key_offsets"]
+        self._description_offsets = arrays["description_offsets"]
+
+        # Blobs are read straight from the mapping by absolute position
+        self._title_start = data_start + header["arrays"]["title_blob"]["offset"]
+        self._title_key_start = data_start + header["arrays"]["title_key_blob"]["offset"]
+        self._description_start = data_start + header["arrays"]["description_blob"]["offset"]
+
+    def __len__(self):
+        return self.count
+
+    def _string(self, blob_start, offsets, idx):
+        start = blob_start + int(offsets[idx])
+        end = blob_start + int(offsets[idx + 1])
+        return self._mmap[start:end].decode("utf-8")
+
+    def title(self, idx):
+        return self._string(self._title_start, self._title_offsets, idx)
+
+    def description(self, idx):
+        return self._string(self._description_start, self._description_offsets, idx)
+
+    def program(self, idx):
+        """
+        Returns one program as a dict with the same keys as a programs row.
+        """
+        minutes = float(self.minutes[idx])
+        return {
+            "title": self.title(idx),
+            "description": self.description(idx),
+            "time_per_workout": None if np.isnan(minutes) else minutes,
+        }
+
+    def level_matrix(self):
+        return np.unpackbits(self._level_bits, axis=1, count=len(self.levels))
+
+    def goal_matrix(self):
+        return np.unpackbits(self._goal_bits, axis=1, count=len(self.goals))
+
+    def find_title(self, text):
+        """
+        Positions of programs whose title contains text (case-insensitive),
+        in catalog order. Scans the title blob in place.
+        """
+        needle = str(text).casefold().encode("utf-8")
+        if not needle:
+            return np.arange(self.count, dtype=np.int64)
+
+        start = self._title_key_start
+        end = start + int(self._title_key_offsets[-1])
+
+        matches = []
+        pos = self._mmap.find(needle, start, end)
+        while pos != -1:
+            rel = pos - start
+            idx = int(np.searchsorted(self._title_key_offsets, rel, side="right")) - 1
+            row_end = int(self._title_key_offsets[idx + 1])
+            if rel + len(needle) <= row_end:
+                matches.append(idx)
+                # One hit per title is enough; continue from the next title
+                pos = self._mmap.find(needle, start + row_end, end)
+            else:
+                pos = self._mmap.find(needle, pos + 1, end)
+        return np.array(matches, dtype=np.int64)
+
+if __name__ == "__main__":
+    df = load_programs(DB_PATH)
+    build_catalog(df, CATALOG_PATH)
+    print(f"Catalog with {len(df)} programs written to {CATALOG_PATH}")
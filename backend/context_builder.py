@@ -0,0 +1,135 @@
+import re
+from collections import namedtuple
+from functools import lru_cache
+
+# Rough size of a token for English text; close enough to budget prompts
+# without shipping a tokenizer
+CHARS_PER_TOKEN = 4
+
+# Upper bound on a program abstract, precomputed at ingest time
+ABSTRACT_CHARS = 280
+
+ABSTRACTS_TABLE = "program_abstracts"
+
+# Distinct (exercise_name, intensity) pairs from program_details, small enough
+# to search with LIKE without scanning every detail row
+EXERCISES_TABLE = "exercise_intensities"
+
+# Relevance weights: where a keyword matched
+TITLE_MATCH = 3.0
+TEXT_MATCH = 1.0
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+_WHITESPACE = re.compile(r"\s+")
+
+Snippet = namedtuple("Snippet", ["section", "key", "text", "score", "order"])
+Context = namedtuple("Context", ["text", "tokens", "included", "dropped"])
+
+def estimate_tokens(text):
+    return -(-len(text) // CHARS_PER_TOKEN)
+
+def summarize(text, max_chars=ABSTRACT_CHARS):
+    """
+    Extractive abstract: leading sentences up to max_chars, or the first
+    sentence cut at a word boundary if that alone is too long.
+    """
+    if not isinstance(text, str):
+        return ""
+    text = _WHITESPACE.sub(" ", text).strip()
+    if len(text) <= max_chars:
+        return text
+
+    abstract = ""
+    for sentence in _SENTENCE_END.split(text):
+        candidate = f"{abstract} {sentence}".strip()
+        if len(candidate) > max_chars:
+            break
+        abstract = candidate
+    if not abstract:
+        abstract = text[:max_chars - 1].rsplit(" ", 1)[0] + "…"
+    return abstract
+
+@lru_cache(maxsize=4096)
+def cached_summary(text):
+    """
+    Abstract computed on demand, for databases built before abstracts existed.
+    """
+    return summarize(text)
+
+def build_abstracts(conn):
+    """
+    (Re)creates the program_abstracts table: one precomputed abstract per
+    program title, so retrieval never has to put full descriptions in a prompt.
+    """
+    cursor = conn.cursor()
+    cursor.execute(f"DROP TABLE IF EXISTS {ABSTRACTS_TABLE}")
+    cursor.execute(f"CREATE TABLE {ABSTRACTS_TABLE} (title TEXT PRIMARY KEY, abstract TEXT)")
+    rows = cursor.execute("SELECT title, description FROM programs WHERE title IS NOT NULL").fetchall()
+    cursor.executemany(
+        f"INSERT OR IGNORE INTO {ABSTRACTS_TABLE} VALUES (?, ?)",
+        ((title, summarize(description)) for title, description in rows)
+    )
+    conn.commit()
+
+def build_exercise_table(conn):
+    """
+    (Re)creates the exercise_intensities table from program_details.
+    """
+    cursor = conn.cursor()
+    cursor.execute(f"DROP TABLE IF EXISTS {EXERCISES_TABLE}")
+    cursor.execute(f"CREATE TABLE {EXERCISES_TABLE} AS SELECT DISTINCT exercise_name, intensity "
+                   "FROM program_details WHERE exercise_name IS NOT NULL")
+    conn.commit()
+
+def match_score(keywords, title, text=""):
+    """
+    Relevance of one entry: each keyword scores more when it is in the title
+    than when it only appears in the body.
+    """
+    title = (title or "").casefold()
+    text = (text or "").casefold()
+    score = 0.0
+    for keyword in keywords:
+        keyword = keyword.casefold()
+        if keyword in title:
+            score += TITLE_MATCH
+        elif keyword in text:
+            score += TEXT_MATCH
+    return score
+
+class ContextBuilder:
+    """
+    Assembles retrieved snippets into a prompt context under a token budget.
+    Snippets are deduplicated by (section, key), ranked by score (ties keep
+    retrieval order), and taken greedily in that order: one that doesn't fit
+    the remaining budget is skipped, and lower-ranked, smaller ones may still
+    be added after it.
+    """
+    def __init__(self, budget_tokens):
+        self.budget_tokens = budget_tokens
+        self.snippets = {}
+
+    def add(self, section, key, text, score):
+        ident = (section, key.casefold() if isinstance(key, str) else key)
+        existing = self.snippets.get(ident)
+        if existing is None or score > existing.score:
+            order = existing.order if existing else len(self.snippets)
+            self.snippets[ident] = Snippet(section, key, text, score, order)
+
+    def build(self):
+        ranked = sorted(self.snippets.values(), key=lambda s: (-s.score, s.order))
+        sections = {}
+        tokens = 0
+        dropped = 0
+        for snippet in ranked:
+            line = f"- {snippet.text}"
+            # Section header costs tokens too, the first time it is used
+            cost = estimate_tokens(line) + (0 if snippet.section in sections else estimate_tokens(snippet.section + ":"))
+            if tokens + cost > self.budget_tokens:
+                dropped += 1
+                continue
+            sections.setdefault(snippet.section, []).append(line)
+            tokens += cost
+
+        blocks = [f"{section}:\n" + "\n".join(lines) for section, lines in sections.items()]
+        return Context("\n\n".join(blocks), tokens, sum(len(lines) for lines in sections.values()), dropped)
@@ -1,11 +1,13 @@
 import sqlite3
 import pandas as pd
 import os
+from catalog import build_catalog, load_programs, CATALOG_PATH
+from context_builder import build_abstracts, build_exercise_table
 
 # Paths
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 ARCHIVE_DIR = os.path.join(BASE_DIR, "..", "archive")
-DB_PATH = os.path.join(BASE_DIR, "workout.db")
+DB_PATH = os.getenv("WORKOUT_DB", os.path.join(BASE_DIR, "workout.db"))
 
 SUMMARY_CSV = os.path.join(ARCHIVE_DIR, "program_summary.csv")
 DETAILED_CSV = os.path.join(ARCHIVE_DIR, "programs_detailed_boostcamp_kaggle.csv")
@@ -51,8 +53,24 @@ def init_db():
     cursor.execute("CREATE INDEX IF NOT EXISTS idx_programs_title ON programs(title)")
     cursor.execute("CREATE INDEX IF NOT EXISTS idx_details_title ON program_details(title)")
     conn.commit()
+
+    # Short abstracts of program descriptions, used in chat prompts
+    if os.path.exists(SUMMARY_CSV):
+        print("Precomputing program abstracts...")
+        build_abstracts(conn)
+
+    # Distinct exercises, so chat retrieval doesn't scan every detail row
+    if os.path.exists(DETAILED_CSV):
+        print("Building exercise table...")
+        build_exercise_table(conn)
     
     conn.close()
+
+    # Build the compact program catalog shared by API workers
+    print("Building program catalog...")
+    build_catalog(load_programs(DB_PATH), CATALOG_PATH)
+    print(f"Catalog written to {CATALOG_PATH}")
+
     print("Database initialization complete.")
 
 if __name__ == "__main__":
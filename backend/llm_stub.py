@@ -0,0 +1,21 @@
+import re
+import time
+from types import SimpleNamespace
+
+class StubModel:
+    """
+    Offline stand-in for genai.GenerativeModel, for load tests.
+    Sleeps for a fixed latency per call and returns canned text shaped like
+    the real responses: keywords for the extraction prompt, a short answer
+    otherwise.
+    """
+    def __init__(self, latency=0.0):
+        self.latency = latency
+
+    def generate_content(self, prompt):
+        time.sleep(self.latency)
+        if prompt.startswith("Extract"):
+            query = prompt.rsplit("Query:", 1)[-1]
+            words = sorted(re.findall(r"[A-Za-z]{3,}", query), key=len, reverse=True)
+            return SimpleNamespace(text=" ".join(words[:2]) or query)
+        return SimpleNamespace(text="Stay consistent, progress gradually and keep good form. (stub response)")
@@ -0,0 +1,280 @@
+import os
+import sys
+import json
+import time
+import uuid
+import random
+import shutil
+import asyncio
+import argparse
+import tempfile
+import subprocess
+import httpx
+from synthetic_db import generate
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Run order: history goes before log, so its payload doesn't grow with the log scenario
+SCENARIOS = ['recommend', 'chat', 'history', 'log', 'vision']
+
+# Entries the history scenario reads, so its payload is the same from run to run
+HISTORY_SIZE = 50
+
+FITNESS_LEVELS = ['Beginner', 'Intermediate', 'Advanced']
+GOALS = ['Weight Loss', 'Muscle Gain', 'Endurance', 'Flexibility']
+QUESTIONS = ["How do I improve my squat depth?", "What is a good beginner strength program?",
+             "How many rest days should I take per week?", "Is HIIT better than steady cardio for fat loss?",
+             "How should I warm up before deadlifts?"]
+
+# Per-frame timeout for the vision scenario; the server sends nothing for dropped frames
+FRAME_TIMEOUT = 5.0
+
+def percentile(sorted_values, p):
+    """
+    Nearest-rank percentile of an already sorted list.
+    """
+    if not sorted_values:
+        return None
+    rank = max(1, -(-len(sorted_values) * p // 100))
+    return sorted_values[int(rank) - 1]
+
+def summarize(latencies, errors, elapsed):
+    """
+    Throughput and latency percentiles (ms) for one scenario.
+    """
+    latencies = sorted(l * 1000 for l in latencies)
+    def ms(value):
+        return None if value is None else round(value, 3)
+    return {
+        "requests": len(latencies) + errors,
+        "errors": errors,
+        "duration_s": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed > 0 else 0.0,
+        "latency_ms": {
+            "mean": ms(sum(latencies) / len(latencies) if latencies else None),
+            "p50": ms(percentile(latencies, 50)),
+            "p90": ms(percentile(latencies, 90)),
+            "p95": ms(percentile(latencies, 95)),
+            "p99": ms(percentile(latencies, 99)),
+            "max": ms(latencies[-1] if latencies else None),
+        },
+    }
+
+def random_profile(rng):
+    return {
+        "age": rng.randint(18, 65),
+        "weight": round(rng.uniform(50, 110), 1),
+        "fitness_level": rng.choice(FITNESS_LEVELS),
+        "goal": rng.choice(GOALS),
+    }
+
+def random_log(rng):
+    return {
+        "id": uuid.uuid4().hex,
+        "date": time.strftime("%Y-%m-%d"),
+        "workout_name": "Load Test Workout",
+        "duration_minutes": rng.choice([30, 45, 60]),
+        "notes": None,
+    }
+
+def http_requests(rng):
+    """
+    One request factory per HTTP scenario: returns (method, path, json body).
+    """
+    return {
+        'recommend': lambda: ("POST", "/recommend", random_profile(rng)),
+        'chat': lambda: ("POST", "/chat", {"message": rng.choice(QUESTIONS)}),
+        'log': lambda: ("POST", "/workouts/log", random_log(rng)),
+        'history': lambda: ("GET", "/workouts/history", None),
+    }
+
+async def run_http_scenario(client, make_request, concurrency, duration):
+    """
+    Keeps `concurrency` requests in flight for `duration` seconds.
+    Non-2xx responses and transport errors count as errors.
+    """
+    latencies = []
+    errors = 0
+    deadline = time.perf_counter() + duration
+
+    async def user():
+        nonlocal errors
+        while time.perf_counter() < deadline:
+            method, path, body = make_request()
+            start = time.perf_counter()
+            try:
+                response = await client.request(method, path, json=body)
+                response.raise_for_status()
+            except httpx.HTTPError:
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(user() for _ in range(concurrency)))
+    return summarize(latencies, errors, time.perf_counter() - start)
+
+async def run_vision_scenario(url, frame, concurrency, duration):
+    """
+    One websocket session per simulated user, each sending frames back to back
+    and timing the round trip to the result.
+    """
+    import websockets
+
+    latencies = []
+    errors = 0
+    deadline = time.perf_counter() + duration
+    ws_url = url.replace("http", "ws", 1) + "/ws/vision"
+
+    async def user():
+        nonlocal errors
+        try:
+            async with websockets.connect(ws_url, max_size=None) as ws:
+                await ws.send("exercise:squat")
+                await asyncio.wait_for(ws.recv(), FRAME_TIMEOUT)
+                while time.perf_counter() < deadline:
+                    start = time.perf_counter()
+                    await ws.send(frame)
+                    try:
+                        await asyncio.wait_for(ws.recv(), FRAME_TIMEOUT)
+                    except asyncio.TimeoutError:
+                        errors += 1
+                        continue
+                    latencies.append(time.perf_counter() - start)
+        except (OSError, asyncio.TimeoutError, websockets.exceptions.WebSocketException):
+            errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(user() for _ in range(concurrency)))
+    return summarize(latencies, errors, time.perf_counter() - start)
+
+def load_frame(path):
+    """
+    JPEG bytes for the vision scenario: the given file, or a generated test image.
+    """
+    if path:
+        with open(path, "rb") as f:
+            return f.read()
+    import cv2
+    import numpy as np
+    image = np.random.default_rng(0).integers(0, 255, (480, 640, 3), dtype=np.uint8)
+    return cv2.imencode(".jpg", image)[1].tobytes()
+
+def start_server(port, db_path, stub_latency_ms, vision_workers):
+    """
+    Runs the API under uvicorn against the synthetic database, with the
+    Gemini model replaced by the local stub.
+    """
+    env = dict(os.environ,
+               WORKOUT_DB=db_path,
+               WORKOUT_CATALOG=os.path.join(os.path.dirname(db_path), "catalog.bin"),
+               LLM_STUB_LATENCY_MS=str(stub_latency_ms),
+               VISION_WORKERS=str(vision_workers))
+    cmd = [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+           "--log-level", "warning"]
+    return subprocess.Popen(cmd, cwd=BASE_DIR, env=env)
+
+def wait_ready(url, process=None, timeout=120):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f"Server exited with code {process.returncode}")
+        try:
+            if httpx.get(url + "/", timeout=1).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError(f"Server at {url} not ready after {timeout}s")
+
+async def seed_history(client, rng, size):
+    """
+    Tops the server's workout history up to `size` entries and returns the
+    resulting count (higher if the server already held more).
+    """
+    history = (await client.get("/workouts/history")).json()
+    for _ in range(size - len(history)):
+        (await client.post("/workouts/log", json=random_log(rng))).raise_for_status()
+    count = max(size, len(history))
+    if count > size:
+        print(f"Server already holds {count} history entries; history results are not comparable "
+              f"with a {size}-entry run.", file=sys.stderr)
+    return count
+
+async def run_scenarios(url, scenarios, concurrency, duration, frame=None, seed=0, history_size=HISTORY_SIZE):
+    rng = random.Random(seed)
+    factories = http_requests(rng)
+    results = {}
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=30) as client:
+        for name in sorted(scenarios, key=SCENARIOS.index):
+            if name == 'vision':
+                results[name] = await run_vision_scenario(url, frame, concurrency, duration)
+            elif name == 'history':
+                entries = await seed_history(client, rng, history_size)
+                results[name] = await run_http_scenario(client, factories[name], concurrency, duration)
+                results[name]["history_entries"] = entries
+            else:
+                results[name] = await run_http_scenario(client, factories[name], concurrency, duration)
+            print(f"{name}: {results[name]['throughput_rps']} req/s, "
+                  f"p99 {results[name]['latency_ms']['p99']} ms", file=sys.stderr)
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline load test of the Aura API. Prints a JSON report.")
+    parser.add_argument("--url", help="Test a running server instead of starting one on a synthetic database")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help=f"Comma-separated subset of {SCENARIOS}")
+    parser.add_argument("--concurrency", type=int, default=16, help="Simultaneous users per scenario")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds per scenario")
+    parser.add_argument("--programs", type=int, default=2600, help="Programs in the synthetic database")
+    parser.add_argument("--weeks", type=int, default=8)
+    parser.add_argument("--stub-latency-ms", type=float, default=200.0, help="Latency of each stubbed LLM call")
+    parser.add_argument("--vision-workers", type=int, default=0, help="VISION_WORKERS for the started server")
+    parser.add_argument("--frame", help="JPEG sent by the vision scenario (default: generated with OpenCV)")
+    parser.add_argument("--history-size", type=int, default=HISTORY_SIZE,
+                        help="Workout log entries present while the history scenario runs")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="Write the report here as well as to stdout")
+    args = parser.parse_args()
+
+    scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"Unknown scenarios: {sorted(unknown)}")
+    scenarios.sort(key=SCENARIOS.index)
+    frame = load_frame(args.frame) if 'vision' in scenarios else None
+
+    config = {k: v for k, v in vars(args).items() if k != 'out'}
+    config["scenarios"] = scenarios
+
+    tmp_dir = server = None
+    url = args.url.rstrip("/") if args.url else f"http://127.0.0.1:{args.port}"
+    try:
+        if not args.url:
+            tmp_dir = tempfile.mkdtemp(prefix="aura-load-")
+            db_path = os.path.join(tmp_dir, "workout.db")
+            print(f"Generating synthetic database ({args.programs} programs)...", file=sys.stderr)
+            generate(db_path, programs=args.programs, weeks=args.weeks, seed=args.seed)
+            server = start_server(args.port, db_path, args.stub_latency_ms, args.vision_workers)
+        wait_ready(url, server)
+        results = asyncio.run(run_scenarios(url, scenarios, args.concurrency, args.duration, frame, args.seed,
+                                             args.history_size))
+    finally:
+        if server is not None:
+            server.terminate()
+            try:
+                server.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                server.kill()
+        if tmp_dir is not None:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    report = json.dumps({"config": config, "results": results}, indent=2)
+    print(report)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(report + "\n")
+
+if __name__ == "__main__":
+    main()
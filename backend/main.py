@@ -1,15 +1,36 @@
-from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect, Query
 from pydantic import BaseModel
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse, PlainTextResponse
 import uuid
 import json
+import os
+import logging
+from contextlib import asynccontextmanager
 
-from models import UserProfile, WeeklyPlan, WorkoutLog
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO").upper())
+logger = logging.getLogger(__name__)
+
+from models import UserProfile, WeeklyPlan, WorkoutLog, ProgramWeek
+from metrics import render_metrics, sample_profile
 from recommender import engine
 from rag_engine import rag_engine
-from vision_engine import VisionEngine
+from vision_pool import VisionPool, LocalVision
+from vision_engine import EXERCISE_CONFIG
+
+# Vision worker processes; 0 runs pose estimation in the API process
+VISION_WORKERS = int(os.getenv("VISION_WORKERS", "0"))
+vision = VisionPool(VISION_WORKERS) if VISION_WORKERS > 0 else LocalVision()
+
+@asynccontextmanager
+async def lifespan(app):
+    vision.start()
+    engine.start_watching()
+    yield
+    engine.stop_watching()
+    vision.stop()
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 origins = [
     "http://localhost:5173",
@@ -24,23 +45,68 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-vision_engine = VisionEngine()
-
 @app.get("/")
 def read_root():
     return {"message": "Welcome to the Workout Recommendation API"}
 
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+# Sampling profiler, only exposed when AURA_PROFILER=1
+PROFILER_ENABLED = os.getenv("AURA_PROFILER") == "1"
+
+@app.get("/debug/profile", response_class=PlainTextResponse)
+def profile(seconds: float = Query(5.0, gt=0, le=60), interval_ms: float = Query(5.0, ge=1, le=1000)):
+    if not PROFILER_ENABLED:
+        raise HTTPException(status_code=404, detail="Not Found")
+    stacks = sample_profile(seconds, interval_ms / 1000)
+    if stacks is None:
+        raise HTTPException(status_code=409, detail="A profile is already running")
+    return stacks
+
 # Mock Database for Guest History
 guest_history = []
 
 @app.post("/recommend", response_model=WeeklyPlan)
-def get_recommendation(profile: UserProfile):
+def get_recommendation(profile: UserProfile, alternatives: int = Query(0, ge=0, le=10)):
     try:
-        plan = engine.predict(profile)
+        plan = engine.predict(profile, alternatives)
         return plan
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/recommend/{recommendation_id}/weeks/{week}", response_model=ProgramWeek)
+def get_recommendation_week(recommendation_id: str, week: int):
+    # Weeks of a recommended program, one page at a time; week 1 is also in the /recommend response
+    try:
+        program_week = engine.get_week(recommendation_id, week)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    if program_week is None:
+        raise HTTPException(status_code=404, detail="Recommendation or week not found")
+    return program_week
+
+@app.get("/model/version")
+def get_model_version():
+    return engine.model_info()
+
+# Batches larger than this are streamed back as NDJSON (one WeeklyPlan per line)
+BATCH_STREAM_THRESHOLD = 100
+
+@app.post("/recommend/batch", response_model=list[WeeklyPlan])
+def get_batch_recommendations(profiles: list[UserProfile], stream: bool = False, alternatives: int = Query(0, ge=0, le=10)):
+    try:
+        if stream or len(profiles) > BATCH_STREAM_THRESHOLD:
+            plans = engine.iter_predict_batch(profiles, alternatives)
+            return StreamingResponse(
+                (plan.model_dump_json() + "\n" for plan in plans),
+                media_type="application/x-ndjson"
+            )
+        return engine.predict_batch(profiles, alternatives)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.post("/workouts/log", response_model=dict)
 async def log_workout(log: WorkoutLog):
     try:
@@ -57,34 +123,43 @@ class ChatRequest(BaseModel):
     message: str
 
 @app.post("/chat")
-async def chat_endpoint(request: ChatRequest):
-    response = rag_engine.generate_response(request.message)
-    return {"response": response}
+def chat_endpoint(request: ChatRequest):
+    reply = rag_engine.generate_response(request.message)
+    return {"response": reply.text, "context_tokens": reply.context_tokens}
 
 @app.websocket("/ws/vision")
 async def websocket_endpoint(websocket: WebSocket):
     await websocket.accept()
+    session_id = str(uuid.uuid4())
     try:
         while True:
             message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(message.get("code", 1000))
             
-            if "text" in message:
+            if message.get("text") is not None:
                 text = message["text"]
                 if text.startswith("exercise:"):
                     exercise = text.split(":")[1]
-                    vision_engine.reset_state(exercise)
+                    # Checked here so the in-process and pool backends behave the same
+                    if exercise not in EXERCISE_CONFIG:
+                        await websocket.send_json({"status": "error", "error": f"Unknown exercise: {exercise}"})
+                        continue
+                    vision.set_exercise(session_id, exercise)
                     await websocket.send_json({"status": "exercise_updated", "exercise": exercise})
-            elif "bytes" in message:
+            elif message.get("bytes") is not None:
                 frame_bytes = message["bytes"]
-                result = vision_engine.process_frame(frame_bytes)
+                result = await vision.process_frame(session_id, frame_bytes)
                 if result:
                     await websocket.send_json(result)
                     
     except WebSocketDisconnect:
-        print("Client disconnected")
+        logger.info("Client disconnected")
     except Exception as e:
-        print(f"Error: {e}")
+        logger.error(f"Error: {e}")
         try:
             await websocket.close()
         except:
             pass
+    finally:
+        vision.close_session(session_id)
@@ -0,0 +1,218 @@
+import sys
+import time
+import bisect
+import threading
+from collections import Counter as _Tally
+from contextlib import contextmanager
+
+# Upper bounds (seconds) for stage latency histograms
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+REGISTRY = []
+
+# Per-thread list that observations go to instead of the metrics (see capture_observations)
+_capture = threading.local()
+
+def _captured(record):
+    records = getattr(_capture, "records", None)
+    if records is None:
+        return False
+    records.append(record)
+    return True
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+def _format_labels(labelnames, values, extra=None):
+    pairs = list(zip(labelnames, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, int):
+        return str(value)
+    return repr(float(value))
+
+class Counter:
+    """
+    Monotonic counter, optionally split by labels.
+    """
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def inc(self, amount=1, **labels):
+        if _captured((self.name, amount, labels)):
+            return
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+class Histogram:
+    """
+    Cumulative-bucket histogram, optionally split by labels.
+    """
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        self._series = {} # labels -> [bucket counts, sum, count]
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def observe(self, value, **labels):
+        if _captured((self.name, value, labels)):
+            return
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        idx = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            series[0][idx] += 1
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (bucket_counts, total, count) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, bucket_counts):
+                    cumulative += bucket_count
+                    labels = _format_labels(self.labelnames, key, ("le", _format_value(bound)))
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                labels = _format_labels(self.labelnames, key)
+                lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+                lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+def render_metrics():
+    """
+    All registered metrics in the Prometheus text exposition format.
+    """
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+@contextmanager
+def capture_observations():
+    """
+    Collects the metric updates made by this thread in the block into a list
+    of (name, value, labels) instead of applying them. Used by worker
+    processes, whose metrics are otherwise invisible to /metrics; the parent
+    applies them with record_observations().
+    """
+    records = []
+    _capture.records = records
+    try:
+        yield records
+    finally:
+        _capture.records = None
+
+def record_observations(records):
+    metrics = {metric.name: metric for metric in REGISTRY}
+    for name, value, labels in records:
+        metric = metrics.get(name)
+        if isinstance(metric, Counter):
+            metric.inc(value, **labels)
+        elif isinstance(metric, Histogram):
+            metric.observe(value, **labels)
+
+STAGE_SECONDS = Histogram(
+    "aura_stage_seconds",
+    "Time spent in each hot-path stage.",
+    ["component", "stage"]
+)
+
+RECOMMEND_PLANS = Counter(
+    "aura_recommend_plans_total",
+    "Plans returned by the recommender, by how the program was chosen.",
+    ["source"]
+)
+
+CHAT_RESPONSES = Counter(
+    "aura_chat_responses_total",
+    "Chat responses, by outcome.",
+    ["status"]
+)
+
+VISION_FRAMES = Counter(
+    "aura_vision_frames_total",
+    "Frames processed by the vision engine, by outcome.",
+    ["result"]
+)
+
+CHAT_CONTEXT_TOKENS = Histogram(
+    "aura_chat_context_tokens",
+    "Estimated tokens of database context put in each chat prompt.",
+    buckets=(32, 64, 128, 256, 512, 1024, 2048, 4096)
+)
+
+MODEL_RELOADS = Counter(
+    "aura_model_reloads_total",
+    "Recommender model hot-swaps from the registry, by outcome.",
+    ["status"]
+)
+
+def stage_timer(component, stage):
+    """
+    Times a block into aura_stage_seconds{component, stage}.
+    """
+    return STAGE_SECONDS.time(component=component, stage=stage)
+
+_profile_lock = threading.Lock()
+
+def sample_profile(seconds, interval=0.005):
+    """
+    Samples the stacks of all other threads every `interval` seconds for
+    `seconds`, and returns them in collapsed-stack format
+    ("frame;frame;frame count" per line, root first), ready for flame graph tools.
+    Only one profile runs at a time; returns None if one is already running.
+    """
+    if not _profile_lock.acquire(blocking=False):
+        return None
+    try:
+        own_thread = threading.get_ident()
+        stacks = _Tally()
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_thread:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({code.co_filename}:{frame.f_lineno})")
+                    frame = frame.f_back
+                stacks[";".join(reversed(stack))] += 1
+            time.sleep(interval)
+        return "\n".join(f"{stack} {count}" for stack, count in stacks.most_common()) + "\n"
+    finally:
+        _profile_lock.release()
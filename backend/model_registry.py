@@ -0,0 +1,95 @@
+import os
+import sys
+import json
+import time
+import uuid
+import shutil
+import tempfile
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+REGISTRY_DIR = os.path.join(BASE_DIR, "registry")
+VERSIONS_DIR = os.path.join(REGISTRY_DIR, "versions")
+CURRENT_PATH = os.path.join(REGISTRY_DIR, "CURRENT")
+
+MODEL_FILE = "workout_model.h5"
+ENCODER_FILE = "encoders.pkl"
+META_FILE = "meta.json"
+
+def _write_atomic(path, data):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except:
+        os.unlink(tmp_path)
+        raise
+
+def publish(model_path, encoder_path, metadata=None, activate=True):
+    """
+    Copies a trained model and its encoders into a new registry version.
+    Both files are staged in a temporary directory that is renamed into
+    place in one step, so readers see either the whole version or none of it.
+    Returns the new version id.
+    """
+    os.makedirs(VERSIONS_DIR, exist_ok=True)
+    version = time.strftime("%Y%m%d-%H%M%S") + "-" + uuid.uuid4().hex[:6]
+
+    staging = tempfile.mkdtemp(dir=VERSIONS_DIR, prefix=".staging-")
+    try:
+        shutil.copyfile(model_path, os.path.join(staging, MODEL_FILE))
+        shutil.copyfile(encoder_path, os.path.join(staging, ENCODER_FILE))
+        meta = {"version": version, "published_at": time.time(), **(metadata or {})}
+        with open(os.path.join(staging, META_FILE), "w") as f:
+            json.dump(meta, f, indent=2)
+        os.chmod(staging, 0o755)
+        os.rename(staging, os.path.join(VERSIONS_DIR, version))
+    except:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+    if activate:
+        activate_version(version)
+    return version
+
+def activate_version(version):
+    """
+    Points CURRENT at an existing version (also used to roll back).
+    """
+    if not os.path.isdir(os.path.join(VERSIONS_DIR, version)):
+        raise ValueError(f"Unknown model version: {version}")
+    _write_atomic(CURRENT_PATH, version + "\n")
+
+def active_version():
+    try:
+        with open(CURRENT_PATH) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+def list_versions():
+    if not os.path.isdir(VERSIONS_DIR):
+        return []
+    return sorted(v for v in os.listdir(VERSIONS_DIR) if not v.startswith("."))
+
+def version_paths(version):
+    """
+    Returns (model_path, encoder_path) for a version.
+    """
+    version_dir = os.path.join(VERSIONS_DIR, version)
+    return os.path.join(version_dir, MODEL_FILE), os.path.join(version_dir, ENCODER_FILE)
+
+def version_metadata(version):
+    with open(os.path.join(VERSIONS_DIR, version, META_FILE)) as f:
+        return json.load(f)
+
+if __name__ == "__main__":
+    # python model_registry.py                  -> list versions
+    # python model_registry.py activate VERSION -> switch (or roll back) the active version
+    if len(sys.argv) == 3 and sys.argv[1] == "activate":
+        activate_version(sys.argv[2])
+        print(f"Active version: {sys.argv[2]}")
+    else:
+        current = active_version()
+        for v in list_versions():
+            print(f"{'*' if v == current else ' '} {v}")
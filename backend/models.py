@@ -44,8 +44,22 @@ class WorkoutLog(BaseModel):
     duration_minutes: int
     notes: Optional[str] = None
 
+class ProgramAlternative(BaseModel):
+    title: str
+    score: float
+    duration_minutes: int
+
 class WeeklyPlan(BaseModel):
     recommendation_id: str
     user_goal: str
     schedule: List[Workout]
     advice: str
+    alternatives: List[ProgramAlternative] = []
+    week: int = 1
+    total_weeks: int = 1
+
+class ProgramWeek(BaseModel):
+    recommendation_id: str
+    week: int
+    total_weeks: int
+    schedule: List[Workout]
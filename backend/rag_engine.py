@@ -1,8 +1,14 @@
 import os
 import google.generativeai as genai
 import sqlite3
+import logging
 import pandas as pd
+from collections import namedtuple
 from dotenv import load_dotenv
+from metrics import stage_timer, CHAT_RESPONSES, CHAT_CONTEXT_TOKENS
+from context_builder import ContextBuilder, ABSTRACTS_TABLE, EXERCISES_TABLE, cached_summary, match_score
+
+logger = logging.getLogger(__name__)
 
 # Load environment variables
 load_dotenv()
@@ -12,14 +18,29 @@ GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 if GEMINI_API_KEY:
     genai.configure(api_key=GEMINI_API_KEY)
 else:
-    print("Warning: GEMINI_API_KEY not found in environment variables.")
+    logger.warning("GEMINI_API_KEY not found in environment variables.")
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-DB_PATH = os.path.join(BASE_DIR, "workout.db")
+DB_PATH = os.getenv("WORKOUT_DB", os.path.join(BASE_DIR, "workout.db"))
+
+# Token budget for the database context in each chat prompt
+RAG_CONTEXT_TOKENS = int(os.getenv("RAG_CONTEXT_TOKENS", "384"))
+
+# Candidates fetched per keyword and table; the budget decides how many are used
+CANDIDATES_PER_KEYWORD = 5
+
+# When set, Gemini is replaced by a local stub with this latency (for load tests)
+LLM_STUB_LATENCY_MS = os.getenv("LLM_STUB_LATENCY_MS")
+
+# A chat answer, with the estimated tokens of database context its prompt carried
+ChatReply = namedtuple("ChatReply", ["text", "context_tokens"])
 
 class RAGEngine:
-    def __init__(self):
-        self.model = genai.GenerativeModel('gemini-2.0-flash')
+    def __init__(self, model=None, context_tokens=RAG_CONTEXT_TOKENS):
+        self.model = model if model is not None else genai.GenerativeModel('gemini-2.0-flash')
+        self.configured = model is not None or bool(GEMINI_API_KEY)
+        self.context_tokens = context_tokens
+        self._tables = None # Names of the DB's tables, checked on first use
 
     def _extract_keywords(self, query):
         """
@@ -33,61 +54,96 @@ class RAGEngine:
         except:
             return [query]
 
+    def _has_table(self, conn, name):
+        if self._tables is None:
+            self._tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+            missing = {ABSTRACTS_TABLE, EXERCISES_TABLE} - self._tables
+            if missing:
+                logger.warning(f"Retrieval tables {sorted(missing)} not found; run init_db.py to build them.")
+        return name in self._tables
+
+    def _search_keywords(self, conn, keywords):
+        """
+        Collects candidate programs and exercises for every keyword into a
+        ContextBuilder. Programs carry their precomputed abstract instead of
+        the full description.
+        """
+        builder = ContextBuilder(self.context_tokens)
+        if self._has_table(conn, ABSTRACTS_TABLE):
+            program_sql = (f"SELECT p.title, p.description, p.level, p.goal, a.abstract FROM programs p "
+                           f"LEFT JOIN {ABSTRACTS_TABLE} a ON a.title = p.title "
+                           f"WHERE p.title LIKE ? OR p.description LIKE ? LIMIT {CANDIDATES_PER_KEYWORD}")
+        else:
+            program_sql = ("SELECT title, description, level, goal, NULL AS abstract FROM programs "
+                           f"WHERE title LIKE ? OR description LIKE ? LIMIT {CANDIDATES_PER_KEYWORD}")
+        # An exercise listed at several intensities is deduped by the builder
+        exercise_table = EXERCISES_TABLE if self._has_table(conn, EXERCISES_TABLE) else "program_details"
+        exercise_sql = (f"SELECT DISTINCT exercise_name, intensity FROM {exercise_table} "
+                        f"WHERE exercise_name LIKE ? LIMIT {CANDIDATES_PER_KEYWORD}")
+
+        for keyword in keywords:
+            query_term = f"%{keyword}%"
+            
+            # 1. Search Programs
+            df_programs = pd.read_sql(program_sql, conn, params=(query_term, query_term))
+            for _, row in df_programs.iterrows():
+                abstract = row['abstract'] if isinstance(row['abstract'], str) else cached_summary(row['description'])
+                builder.add(
+                    "Programs", row['title'],
+                    f"{row['title']} ({row['level']}, {row['goal']}): {abstract}",
+                    match_score(keywords, row['title'], row['description'])
+                )
+
+            # 2. Search Exercises
+            df_exercises = pd.read_sql(exercise_sql, conn, params=(query_term,))
+            for _, row in df_exercises.iterrows():
+                builder.add(
+                    "Exercises", row['exercise_name'],
+                    f"{row['exercise_name']} (Intensity: {row['intensity']})",
+                    match_score(keywords, row['exercise_name'])
+                )
+
+        return builder
+
     def _retrieve_context(self, query):
         """
-        Keyword-based retrieval from the database.
+        Keyword-based retrieval from the database, assembled within the
+        context token budget. Returns (context text, estimated context tokens).
         """
-        context_parts = []
         try:
             conn = sqlite3.connect(DB_PATH)
             
             # Extract keywords
-            keywords = self._extract_keywords(query)
-            print(f"Search keywords: {keywords}")
+            with stage_timer("chat", "keyword_extraction"):
+                keywords = self._extract_keywords(query)
+            logger.debug(f"Search keywords: {keywords}")
             
-            for keyword in keywords:
-                query_term = f"%{keyword}%"
-                
-                # 1. Search Programs
-                df_programs = pd.read_sql(
-                    "SELECT title, description, level, goal FROM programs WHERE title LIKE ? OR description LIKE ? LIMIT 2",
-                    conn,
-                    params=(query_term, query_term)
-                )
-                
-                if not df_programs.empty:
-                    context_parts.append(f"Found Programs for '{keyword}':")
-                    for _, row in df_programs.iterrows():
-                        context_parts.append(f"- {row['title']} ({row['level']}, {row['goal']}): {row['description']}")
-
-                # 2. Search Exercises
-                df_exercises = pd.read_sql(
-                    "SELECT DISTINCT exercise_name, intensity FROM program_details WHERE exercise_name LIKE ? LIMIT 3",
-                    conn,
-                    params=(query_term,)
-                )
-                
-                if not df_exercises.empty:
-                    context_parts.append(f"\nFound Exercises for '{keyword}':")
-                    for _, row in df_exercises.iterrows():
-                        context_parts.append(f"- {row['exercise_name']} (Intensity: {row['intensity']})")
+            with stage_timer("chat", "retrieval"):
+                context = self._search_keywords(conn, keywords).build()
 
             conn.close()
+
+            CHAT_CONTEXT_TOKENS.observe(context.tokens)
+            logger.debug(f"Context: {context.included} snippets, ~{context.tokens} tokens, {context.dropped} over budget")
             
-            if not context_parts:
-                return "No specific workout data found in the database for this query."
+            if not context.text:
+                return "No specific workout data found in the database for this query.", 0
             
-            return "\n".join(context_parts)
+            return context.text, context.tokens
 
         except Exception as e:
-            print(f"Error retrieving context: {e}")
-            return "Error retrieving database context."
+            logger.error(f"Error retrieving context: {e}")
+            return "Error retrieving database context.", 0
 
     def generate_response(self, user_query):
-        if not GEMINI_API_KEY:
-            return "I'm sorry, but the AI service is not configured (missing API Key)."
+        """
+        Returns a ChatReply.
+        """
+        if not self.configured:
+            CHAT_RESPONSES.inc(status="unconfigured")
+            return ChatReply("I'm sorry, but the AI service is not configured (missing API Key).", 0)
 
-        context = self._retrieve_context(user_query)
+        context, context_tokens = self._retrieve_context(user_query)
         
         system_prompt = f"""
         You are an expert fitness coach for the Aura Workout App.
@@ -103,9 +159,18 @@ class RAGEngine:
         """
         
         try:
-            response = self.model.generate_content(system_prompt)
-            return response.text
+            with stage_timer("chat", "generation"):
+                response = self.model.generate_content(system_prompt)
+            CHAT_RESPONSES.inc(status="ok")
+            return ChatReply(response.text, context_tokens)
         except Exception as e:
-            return f"I encountered an error generating a response: {str(e)}"
+            logger.error(f"Error generating response: {e}")
+            CHAT_RESPONSES.inc(status="error")
+            return ChatReply(f"I encountered an error generating a response: {str(e)}", context_tokens)
 
-rag_engine = RAGEngine()
+if LLM_STUB_LATENCY_MS is not None:
+    from llm_stub import StubModel
+    logger.warning(f"Using stub LLM with {LLM_STUB_LATENCY_MS} ms latency.")
+    rag_engine = RAGEngine(StubModel(float(LLM_STUB_LATENCY_MS) / 1000))
+else:
+    rag_engine = RAGEngine()
@@ -0,0 +1,154 @@
+import numpy as np
+from collections import namedtuple
+from models import FitnessLevel, Goal
+
+LEVEL_MAP = {
+    FitnessLevel.BEGINNER: ['Beginner', 'Novice'],
+    FitnessLevel.INTERMEDIATE: ['Intermediate'],
+    FitnessLevel.ADVANCED: ['Advanced']
+}
+
+GOAL_MAP = {
+    Goal.WEIGHT_LOSS: ['Fat Loss', 'Cardio', 'Athletics'],
+    Goal.MUSCLE_GAIN: ['Bodybuilding', 'Muscle & Sculpting', 'Powerbuilding', 'Hypertrophy'],
+    Goal.ENDURANCE: ['Athletics', 'Cardio'],
+    Goal.FLEXIBILITY: ['Yoga', 'Mobility']
+}
+
+# Preferred session length (minutes) before age/weight adjustments
+BASE_MINUTES = {
+    FitnessLevel.BEGINNER: 45,
+    FitnessLevel.INTERMEDIATE: 60,
+    FitnessLevel.ADVANCED: 75
+}
+
+# Goals with heavy joint loading, avoided for low-impact profiles
+HIGH_IMPACT_GOALS = ['Powerlifting', 'Olympic Weightlifting', 'Athletics']
+
+# Score weights
+LEVEL_WEIGHT = 1.0
+GOAL_WEIGHT = 2.0
+TIME_WEIGHT = 0.5
+IMPACT_PENALTY = 1.0
+DIVERSITY_WEIGHT = 0.5
+
+ProfileQuery = namedtuple("ProfileQuery", ["fitness_level", "goal", "target_minutes", "low_impact"])
+
+def profile_query(profile):
+    """
+    Reduces a UserProfile to the inputs the ranker scores on.
+    Profiles that map to the same query get the same ranking.
+    """
+    target_minutes = BASE_MINUTES.get(profile.fitness_level, 60)
+    if profile.age >= 50:
+        target_minutes -= 15
+
+    low_impact = profile.age < 16 or profile.age >= 65 or profile.weight >= 120
+    if low_impact:
+        target_minutes -= 15
+
+    return ProfileQuery(profile.fitness_level, profile.goal, max(target_minutes, 30), low_impact)
+
+class ProgramRanker:
+    """
+    Scores every program in the catalog against a profile in one NumPy pass.
+    Level and goal tags are precomputed into 0/1 indicator matrices, so a
+    query is a couple of small matrix products over the whole catalog.
+    """
+    def __init__(self, catalog):
+        self.levels = list(catalog.levels)
+        self.goals = list(catalog.goals)
+
+        self.level_bits = catalog.level_matrix().astype(np.float32)
+        self.goal_bits = catalog.goal_matrix().astype(np.float32)
+        self.goal_counts = self.goal_bits.sum(axis=1)
+
+        self.minutes = np.asarray(catalog.minutes, dtype=np.float32)
+        self.has_minutes = ~np.isnan(self.minutes)
+
+        # Programs a low-impact profile should be steered away from
+        advanced_only = np.zeros(len(self.minutes), dtype=bool)
+        if 'Advanced' in self.levels:
+            advanced_only = (self.level_bits[:, self.levels.index('Advanced')] == 1) & (self.level_bits.sum(axis=1) == 1)
+        high_impact_cols = [self.goals.index(g) for g in HIGH_IMPACT_GOALS if g in self.goals]
+        high_impact = self.goal_bits[:, high_impact_cols].any(axis=1)
+        self.strenuous = (advanced_only | high_impact).astype(np.float32)
+
+        # Combined tags, used to measure similarity between programs for diversity
+        self.features = np.hstack([self.level_bits, self.goal_bits])
+        self.feature_counts = self.features.sum(axis=1)
+
+    def __len__(self):
+        return len(self.minutes)
+
+    def _encode(self, queries):
+        levels = [LEVEL_MAP.get(q.fitness_level, []) for q in queries]
+        goals = [GOAL_MAP.get(q.goal, []) for q in queries]
+        u_level = np.array([[1 if l in ls else 0 for l in self.levels] for ls in levels], dtype=np.float32).reshape(len(queries), len(self.levels))
+        u_goal = np.array([[1 if g in gs else 0 for g in self.goals] for gs in goals], dtype=np.float32).reshape(len(queries), len(self.goals))
+        target = np.array([q.target_minutes for q in queries], dtype=np.float32)
+        low_impact = np.array([q.low_impact for q in queries], dtype=np.float32)
+        return u_level, u_goal, target, low_impact
+
+    def score(self, queries):
+        """
+        Returns a (len(queries), len(catalog)) array of scores; higher is better.
+        """
+        u_level, u_goal, target, low_impact = self._encode(queries)
+
+        # Any shared level tag counts as a level match
+        level_match = np.minimum(u_level @ self.level_bits.T, 1)
+
+        # Jaccard overlap between the user's goal tags and the program's
+        inter = u_goal @ self.goal_bits.T
+        union = u_goal.sum(axis=1)[:, None] + self.goal_counts[None, :] - inter
+        goal_overlap = np.divide(inter, union, out=np.zeros_like(inter), where=union > 0)
+
+        # 1 at the target session length, falling to 0 at 100% off; unknown lengths are neutral
+        with np.errstate(invalid='ignore'):
+            time_diff = np.abs(self.minutes[None, :] - target[:, None]) / target[:, None]
+        time_fit = np.where(self.has_minutes[None, :], 1 - np.minimum(time_diff, 1), 0.5)
+
+        penalty = low_impact[:, None] * self.strenuous[None, :]
+
+        return (LEVEL_WEIGHT * level_match
+                + GOAL_WEIGHT * goal_overlap
+                + TIME_WEIGHT * time_fit
+                - IMPACT_PENALTY * penalty)
+
+    def top_k(self, scores, k, exclude=()):
+        """
+        Picks up to k program positions from one row of scores by maximal
+        marginal relevance: each pick trades its score against tag overlap
+        with the programs already picked.
+        """
+        if k <= 0 or len(scores) == 0:
+            return []
+
+        scores = np.array(scores, dtype=np.float32)
+        scores[list(exclude)] = -np.inf
+
+        # Only the best few candidates can win, so diversify over a small pool
+        pool_size = min(len(scores), k * 10)
+        pool = np.argpartition(-scores, pool_size - 1)[:pool_size]
+        pool = pool[np.isfinite(scores[pool])]
+
+        pool_scores = scores[pool]
+        features = self.features[pool]
+        counts = self.feature_counts[pool]
+        max_sim = np.zeros(len(pool), dtype=np.float32)
+        available = np.ones(len(pool), dtype=bool)
+
+        picked = []
+        while len(picked) < k and available.any():
+            mmr = np.where(available, pool_scores - DIVERSITY_WEIGHT * max_sim, -np.inf)
+            best = int(np.argmax(mmr))
+            picked.append(int(pool[best]))
+            available[best] = False
+
+            inter = features @ features[best]
+            union = counts + counts[best] - inter
+            sim = np.divide(inter, union, out=np.zeros_like(inter), where=union > 0)
+            max_sim = np.maximum(max_sim, sim)
+
+        return picked
@@ -1,188 +1,529 @@
 import pandas as pd
-from sklearn.neighbors import NearestNeighbors
-from sklearn.preprocessing import MultiLabelBinarizer
 import numpy as np
-from models import UserProfile, WeeklyPlan, Workout, FitnessLevel, Goal, Exercise
+from models import UserProfile, WeeklyPlan, Workout, Exercise, ProgramAlternative, ProgramWeek
+from ranker import ProgramRanker, profile_query
+from catalog import ProgramCatalog, build_catalog, load_programs, CATALOG_PATH
+from metrics import stage_timer, RECOMMEND_PLANS, MODEL_RELOADS
+from model_registry import active_version, version_paths
+from collections import namedtuple, OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
 import uuid
 import os
+import hmac
+import json
+import base64
+import hashlib
+import tempfile
+import time
+import logging
 import sqlite3
-import ast
 import random
+import threading
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-DB_PATH = os.path.join(BASE_DIR, "workout.db")
+DB_PATH = os.getenv("WORKOUT_DB", os.path.join(BASE_DIR, "workout.db"))
+
+# Model files used when the registry has no published version
+LEGACY_MODEL_PATH = os.path.join(BASE_DIR, "workout_model.h5")
+LEGACY_ENCODER_PATH = os.path.join(BASE_DIR, "encoders.pkl")
+
+# How often the engine checks the registry for a new active version
+MODEL_POLL_SECONDS = float(os.getenv("MODEL_POLL_SECONDS", "10"))
+
+logger = logging.getLogger(__name__)
+
+# Program weeks kept loaded for week-by-week paging
+WEEK_CACHE_SIZE = int(os.getenv("WEEK_CACHE_SIZE", "512"))
+
+# Key that signs recommendation ids; every worker must use the same one.
+# Without RECOMMENDATION_SECRET, a key file is created next to the DB.
+RECOMMENDATION_SECRET = os.getenv("RECOMMENDATION_SECRET")
+RECOMMENDATION_KEY_PATH = os.path.join(os.path.dirname(DB_PATH), "recommendation.key")
+
+# A loaded model with its encoders; swapped as one reference
+NNModel = namedtuple("NNModel", ["version", "model", "encoders", "loaded_at"])
+
+# What a recommendation_id carries to serve the rest of its program
+Recommendation = namedtuple("Recommendation", ["title", "difficulty", "total_weeks"])
+
+def _b64encode(data):
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+def _b64decode(text):
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+def _load_signing_key():
+    """
+    RECOMMENDATION_SECRET, or the key in RECOMMENDATION_KEY_PATH, created on
+    first use. The file is written aside and hard-linked into place, so
+    workers starting together all end up reading the same complete key.
+    """
+    if RECOMMENDATION_SECRET:
+        return RECOMMENDATION_SECRET.encode("utf-8")
+    try:
+        if not os.path.exists(RECOMMENDATION_KEY_PATH):
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(RECOMMENDATION_KEY_PATH), suffix=".tmp")
+            try:
+                with os.fdopen(fd, "w") as f:
+                    f.write(os.urandom(32).hex())
+                os.link(tmp_path, RECOMMENDATION_KEY_PATH)
+            except FileExistsError:
+                pass # Another worker created it first
+            finally:
+                os.unlink(tmp_path)
+        with open(RECOMMENDATION_KEY_PATH) as f:
+            return f.read().strip().encode("utf-8")
+    except OSError as e:
+        logger.warning(f"Cannot use {RECOMMENDATION_KEY_PATH} ({e}); recommendation ids are only valid in this process.")
+        return os.urandom(32)
+
+class _LRUCache:
+    """
+    Thread-safe dict that evicts the least recently used entries past maxsize.
+    """
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._data:
+                return None
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def get_or_create(self, key, factory):
+        """
+        Returns (value, created); factory() is called under the lock, so only
+        one caller creates a missing entry.
+        """
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                return self._data[key], False
+            value = self._data[key] = factory()
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+            return value, True
+
+    def pop(self, key):
+        with self._lock:
+            return self._data.pop(key, None)
 
 class RecommenderEngine:
     def __init__(self):
-        self.mlb_fitness = MultiLabelBinarizer()
-        self.mlb_goal = MultiLabelBinarizer()
-        self.model = None # NN Model
-        self.encoders = None
-        self.knn_model = NearestNeighbors(n_neighbors=1, metric='hamming') # Fallback
-        self.df_programs = pd.DataFrame()
+        self.nn = None # NNModel, replaced whole when a new version is published
+        self.ranker = None # Fallback, also ranks NN matches
+        self.catalog = None # Memory-mapped program table, shared between workers
+        self.weeks = _LRUCache(WEEK_CACHE_SIZE) # (title, week) -> Future of that week's days
+        self._signing_key = _load_signing_key()
+        self._prefetcher = ThreadPoolExecutor(max_workers=2, thread_name_prefix="week-prefetch")
         
         # Load Data for Fallback
         if os.path.exists(DB_PATH):
-            self._load_data_and_train()
+            self._load_catalog()
         else:
-            print(f"Warning: Database not found at {DB_PATH}")
+            logger.warning(f"Database not found at {DB_PATH}")
 
         # Load Trained NN Model
-        self._load_nn_model()
+        self._failed_version = None
+        self._watcher = None
+        self._stop_watching = threading.Event()
+        self._load_initial_model()
+
+    def _load_initial_model(self):
+        version = active_version()
+        if version is not None:
+            model_path, encoder_path = version_paths(version)
+        else:
+            version, model_path, encoder_path = "legacy", LEGACY_MODEL_PATH, LEGACY_ENCODER_PATH
 
-    def _load_nn_model(self):
         try:
-            model_path = os.path.join(BASE_DIR, "workout_model.h5")
-            encoder_path = os.path.join(BASE_DIR, "encoders.pkl")
-            
             if os.path.exists(model_path) and os.path.exists(encoder_path):
-                import tensorflow as tf
-                import pickle
-                self.model = tf.keras.models.load_model(model_path)
-                with open(encoder_path, "rb") as f:
-                    self.encoders = pickle.load(f)
-                print("Trained Neural Network model loaded successfully.")
+                self.nn = self._load_nn_model(version, model_path, encoder_path)
+                logger.info(f"Trained Neural Network model {version} loaded successfully.")
             else:
-                print("Trained model not found. Using KNN fallback.")
+                logger.info("Trained model not found. Using ranked fallback.")
         except Exception as e:
-            print(f"Error loading NN model: {e}")
+            self._failed_version = version
+            logger.warning(f"Error loading NN model: {e}")
+
+    def _load_nn_model(self, version, model_path, encoder_path):
+        import tensorflow as tf
+        import pickle
+        model = tf.keras.models.load_model(model_path)
+        with open(encoder_path, "rb") as f:
+            encoders = pickle.load(f)
+
+        # Warm up so the first request served by this model doesn't pay for
+        # graph building: a single row (the /recommend path), then two more
+        # batch sizes, after which the traced graph accepts any batch size
+        f_codes = np.arange(len(encoders['fitness'].classes_))
+        g_codes = np.arange(len(encoders['goal'].classes_))
+        X = np.array(np.meshgrid(f_codes, g_codes)).T.reshape(-1, 2)
+        for rows in (1, 2, len(X)):
+            model.predict(X[:rows], verbose=0)
+
+        return NNModel(version, model, encoders, time.time())
+
+    def refresh_model(self):
+        """
+        Loads the registry's active version if it isn't the one being served,
+        then swaps it in. Requests already running keep the model they started
+        with. Returns True if a new model was swapped in.
+        """
+        version = active_version()
+        current = self.nn.version if self.nn else None
+        if version is None or version == current or version == self._failed_version:
+            return False
 
-    def _load_data_and_train(self):
         try:
-            conn = sqlite3.connect(DB_PATH)
-            self.df_programs = pd.read_sql("SELECT * FROM programs", conn)
-            conn.close()
+            nn = self._load_nn_model(version, *version_paths(version))
+        except Exception as e:
+            self._failed_version = version
+            MODEL_RELOADS.inc(status="error")
+            logger.error(f"Error loading model version {version}: {e}")
+            return False
 
-            # Filter out invalid programs (numeric titles or too short)
-            # Remove rows where title is purely numeric
-            self.df_programs = self.df_programs[~self.df_programs['title'].astype(str).str.match(r'^\d+$')]
-            # Remove rows where title is suspiciously short
-            self.df_programs = self.df_programs[self.df_programs['title'].astype(str).str.len() >= 3]
+        self.nn = nn
+        MODEL_RELOADS.inc(status="ok")
+        logger.info(f"Swapped in model version {version} (was {current}).")
+        return True
 
+    def start_watching(self, interval=MODEL_POLL_SECONDS):
+        """
+        Polls the registry in a background thread and hot-swaps new versions.
+        """
+        if self._watcher is not None:
+            return
+        self._stop_watching.clear()
+        self._watcher = threading.Thread(target=self._watch_registry, args=(interval,), name="model-watcher", daemon=True)
+        self._watcher.start()
 
-            # Parse stringified lists
-            self.df_programs['level_list'] = self.df_programs['level'].apply(lambda x: self._safe_eval(x))
-            self.df_programs['goal_list'] = self.df_programs['goal'].apply(lambda x: self._safe_eval(x))
+    def stop_watching(self):
+        if self._watcher is None:
+            return
+        self._stop_watching.set()
+        self._watcher.join()
+        self._watcher = None
 
-            # Create feature matrix for KNN fallback
-            all_levels = set([item for sublist in self.df_programs['level_list'] for item in sublist])
-            all_goals = set([item for sublist in self.df_programs['goal_list'] for item in sublist])
-            
-            self.mlb_fitness.fit([list(all_levels)])
-            self.mlb_goal.fit([list(all_goals)])
-            
-            X_fitness = self.mlb_fitness.transform(self.df_programs['level_list'])
-            X_goal = self.mlb_goal.transform(self.df_programs['goal_list'])
-            
-            self.X = np.hstack([X_fitness, X_goal])
-            self.knn_model.fit(self.X)
-            print(f"KNN Recommender trained on {len(self.df_programs)} programs.")
+    def _watch_registry(self, interval):
+        while not self._stop_watching.wait(interval):
+            try:
+                self.refresh_model()
+            except Exception as e:
+                logger.error(f"Error checking model registry: {e}")
+
+    def model_info(self):
+        nn = self.nn
+        return {
+            "version": nn.version if nn else None,
+            "loaded_at": nn.loaded_at if nn else None,
+            "registry_version": active_version(),
+        }
+
+    def _load_catalog(self):
+        try:
+            # (Re)build the catalog file when it is missing or older than the DB
+            if not os.path.exists(CATALOG_PATH) or os.path.getmtime(CATALOG_PATH) < os.path.getmtime(DB_PATH):
+                logger.info(f"Building program catalog at {CATALOG_PATH}...")
+                build_catalog(load_programs(DB_PATH), CATALOG_PATH)
+
+            self.catalog = ProgramCatalog(CATALOG_PATH)
+
+            # Precompute the ranking index (row positions match the catalog)
+            self.ranker = ProgramRanker(self.catalog)
+            logger.info(f"Ranker indexed {len(self.ranker)} programs.")
             
         except Exception as e:
-            print(f"Error loading data: {e}")
+            logger.error(f"Error loading data: {e}")
+
+    def predict(self, profile: UserProfile, alternatives=0) -> WeeklyPlan:
+        return self.predict_batch([profile], alternatives)[0]
+
+    def predict_batch(self, profiles, alternatives=0):
+        return list(self.iter_predict_batch(profiles, alternatives))
+
+    def iter_predict_batch(self, profiles, alternatives=0):
+        """
+        Returns an iterator of one WeeklyPlan per profile, in input order, each
+        listing up to `alternatives` other ranked programs. Plans hold the
+        program's first week; later weeks are paged with get_week().
+        Profiles that reduce to the same ranking query are scored once, in a
+        single pass for the whole batch, and each selected program's details
+        are fetched from the DB once.
+        Scoring and DB fetches run before this returns, so their errors reach
+        the caller instead of surfacing mid-stream; only plan building is lazy.
+        """
+        with stage_timer("recommend", "encode"):
+            queries = [profile_query(p) for p in profiles]
+            unique_queries = list(dict.fromkeys(queries))
+
+        with stage_timer("recommend", "inference"):
+            programs = self._select_programs(unique_queries, alternatives)
+
+        try:
+            titles = {program['title'] for program, _, _ in programs.values()}
+            with stage_timer("recommend", "db_fetch"):
+                program_days = self._fetch_program_days(titles)
+                program_weeks = self._fetch_total_weeks(titles)
+        except Exception as e:
+            logger.error(f"Error loading program details: {e}")
+            programs, program_days, program_weeks = {}, {}, {}
 
-    def _safe_eval(self, x):
+        # Week 1 is cached as it was just loaded; week 2 is loaded in the background
+        for title, days in program_days.items():
+            self._cache_week(title, 1, days)
+            if program_weeks.get(title, 1) > 1:
+                self._prefetch_week(title, 2)
+
+        return self._iter_plans(profiles, queries, programs, program_days, program_weeks)
+
+    def _iter_plans(self, profiles, queries, programs, program_days, program_weeks):
+        for profile, query in zip(profiles, queries):
+            with stage_timer("recommend", "plan_build"):
+                plan, source = self._build_plan(profile, programs.get(query), program_days, program_weeks)
+            RECOMMEND_PLANS.inc(source=source)
+            yield plan
+
+    def _build_plan(self, profile, selection, program_days, program_weeks):
+        """
+        Returns (plan, source) where source is how the program was chosen.
+        """
+        if selection is None:
+            return self._generate_fallback_plan(profile), "fallback"
+        program, program_alternatives, source = selection
         try:
-            return ast.literal_eval(x)
-        except:
-            return []
+            plan = self._generate_plan_from_program(
+                program, profile, program_days.get(program['title'], []), program_alternatives,
+                program_weeks.get(program['title'], 1)
+            )
+            return plan, source
+        except Exception as e:
+            logger.error(f"Prediction error: {e}")
+            return self._generate_fallback_plan(profile), "fallback"
+
+    def _select_programs(self, queries, alternatives=0):
+        """
+        Maps each ranking query to (program row, [ProgramAlternative, ...], source),
+        where source is "nn" or "ranked".
+        Queries without a match are left out.
+        """
+        if not queries or self.ranker is None or len(self.catalog) == 0:
+            return {}
+
+        scores = self.ranker.score(queries)
+        chosen = {}
 
-    def predict(self, profile: UserProfile) -> WeeklyPlan:
-        # Try NN Prediction first
-        if self.model and self.encoders:
+        # Try NN Prediction first, with one model snapshot for the whole batch
+        nn = self.nn
+        if nn is not None:
             try:
-                print("Using Neural Network for prediction...")
-                # Encode inputs
-                fitness_val = profile.fitness_level.value
-                goal_val = profile.goal.value
-                
-                # Handle potential encoding errors if value not seen during training
-                try:
-                    f_enc = self.encoders['fitness'].transform([fitness_val])[0]
-                    g_enc = self.encoders['goal'].transform([goal_val])[0]
-                except ValueError:
-                    print("Input value not seen in training. Falling back to KNN.")
-                    raise ValueError("Unknown category")
-
-                # Predict
-                prediction = self.model.predict([[f_enc, g_enc]])
-                predicted_class = np.argmax(prediction)
-                predicted_workout_type = self.encoders['target'].inverse_transform([predicted_class])[0]
-                
-                print(f"NN Predicted Workout Type: {predicted_workout_type}")
-                
-                # Find matching program in DB
-                # We assume 'workout_type' maps to 'title' or we search for it
-                # For now, let's try to find a program where title contains this string
-                # or is close to it.
-                
-                # Simple exact match or substring match
-                matches = self.df_programs[self.df_programs['title'].str.contains(predicted_workout_type, case=False, regex=False)]
-                
-                if not matches.empty:
-                    program = matches.iloc[0]
-                    return self._generate_plan_from_program(program, profile)
-                else:
-                    print(f"No program found for type '{predicted_workout_type}'. Falling back.")
-                    
+                chosen.update((i, (idx, "nn")) for i, idx in self._select_programs_nn(nn, queries, scores).items())
             except Exception as e:
-                print(f"NN Prediction failed: {e}")
-                # Fall through to KNN
+                logger.warning(f"NN Prediction failed: {e}")
+                # Fall through to ranking
+
+        remaining = [i for i in range(len(queries)) if i not in chosen]
+        if remaining:
+            logger.debug("Using ranked fallback...")
+            for i in remaining:
+                chosen[i] = (int(np.argmax(scores[i])), "ranked")
 
-        # Fallback to KNN
-        if self.df_programs.empty:
-            return self._generate_fallback_plan(profile)
+        selected = {}
+        for i, (idx, source) in chosen.items():
+            alt_idxs = self.ranker.top_k(scores[i], alternatives, exclude=[idx])
+            selected[queries[i]] = (
+                self.catalog.program(idx),
+                [self._program_alternative(j, scores[i][j]) for j in alt_idxs],
+                source
+            )
+        return selected
 
+    def _select_programs_nn(self, nn, queries, scores):
+        """
+        Maps query positions to the best-ranked program whose title matches
+        the NN's predicted workout type.
+        """
+        logger.debug("Using Neural Network for prediction...")
+        fitness_vals = np.array([q.fitness_level.value for q in queries])
+        goal_vals = np.array([q.goal.value for q in queries])
+
+        # Values not seen during training can't be encoded; those fall back to ranking
+        known = np.isin(fitness_vals, nn.encoders['fitness'].classes_) & np.isin(goal_vals, nn.encoders['goal'].classes_)
+        if not known.all():
+            logger.info("Input value not seen in training. Falling back to ranking.")
+        if not known.any():
+            return {}
+
+        X = np.column_stack([
+            nn.encoders['fitness'].transform(fitness_vals[known]),
+            nn.encoders['goal'].transform(goal_vals[known]),
+        ])
+
+        # Predict
+        prediction = nn.model.predict(X, verbose=0)
+        predicted_types = nn.encoders['target'].inverse_transform(np.argmax(prediction, axis=1))
+
+        # Find matching programs in DB: titles containing the workout type
+        chosen = {}
+        candidates_by_type = {}
+        for i, workout_type in zip(np.flatnonzero(known), predicted_types):
+            if workout_type not in candidates_by_type:
+                logger.debug(f"NN Predicted Workout Type: {workout_type}")
+                candidates_by_type[workout_type] = self.catalog.find_title(workout_type)
+                if not len(candidates_by_type[workout_type]):
+                    logger.info(f"No program found for type '{workout_type}'. Falling back.")
+
+            candidates = candidates_by_type[workout_type]
+            if len(candidates):
+                chosen[int(i)] = int(candidates[np.argmax(scores[i, candidates])])
+
+        return chosen
+
+    def _program_alternative(self, idx, score):
+        program = self.catalog.program(idx)
+        return ProgramAlternative(
+            title=program['title'],
+            score=round(float(score), 3),
+            duration_minutes=int(program['time_per_workout']) if pd.notnull(program['time_per_workout']) else 60
+        )
+
+    def _sign_recommendation(self, recommendation):
+        """
+        Encodes a recommendation into a signed id, so any worker (or a
+        restarted one) can serve its weeks without shared state.
+        A nonce keeps ids unique per response.
+        """
+        payload = _b64encode(json.dumps([*recommendation, uuid.uuid4().hex[:8]], separators=(",", ":")).encode("utf-8"))
+        signature = hmac.new(self._signing_key, payload.encode("ascii"), hashlib.sha256).digest()[:16]
+        return f"{payload}.{_b64encode(signature)}"
+
+    def _read_recommendation(self, recommendation_id):
+        """
+        The Recommendation in a signed id, or None if it is malformed or the
+        signature doesn't match.
+        """
         try:
-            print("Using KNN Fallback...")
-            level_map = {
-                FitnessLevel.BEGINNER: ['Beginner', 'Novice'],
-                FitnessLevel.INTERMEDIATE: ['Intermediate'],
-                FitnessLevel.ADVANCED: ['Advanced']
-            }
-            
-            goal_map = {
-                Goal.WEIGHT_LOSS: ['Fat Loss', 'Cardio', 'Athletics'],
-                Goal.MUSCLE_GAIN: ['Bodybuilding', 'Muscle & Sculpting', 'Powerbuilding', 'Hypertrophy'],
-                Goal.ENDURANCE: ['Athletics', 'Cardio'],
-                Goal.FLEXIBILITY: ['Yoga', 'Mobility']
-            }
-
-            user_levels = level_map.get(profile.fitness_level, [])
-            user_goals = goal_map.get(profile.goal, [])
-            
-            valid_levels = [l for l in user_levels if l in self.mlb_fitness.classes_]
-            valid_goals = [g for g in user_goals if g in self.mlb_goal.classes_]
-            
-            if not valid_levels: valid_levels = []
-            if not valid_goals: valid_goals = []
+            payload, signature = recommendation_id.split(".")
+            expected = hmac.new(self._signing_key, payload.encode("ascii"), hashlib.sha256).digest()[:16]
+            if not hmac.compare_digest(expected, _b64decode(signature)):
+                return None
+            title, difficulty, total_weeks, _nonce = json.loads(_b64decode(payload))
+            return Recommendation(title, difficulty, int(total_weeks))
+        except (ValueError, TypeError, UnicodeError):
+            return None
 
-            u_fitness = self.mlb_fitness.transform([valid_levels])
-            u_goal = self.mlb_goal.transform([valid_goals])
-            
-            query_vec = np.hstack([u_fitness, u_goal])
-            
-            distances, indices = self.knn_model.kneighbors(query_vec)
-            best_idx = indices[0][0]
-            program = self.df_programs.iloc[best_idx]
-            
-            return self._generate_plan_from_program(program, profile)
+    def get_week(self, recommendation_id, week):
+        """
+        One week of a recommended program, or None if the recommendation id
+        is invalid, its program is no longer in the catalog, or the week is out
+        of range. The following week is prefetched in the background while this
+        one is being viewed.
+        """
+        recommendation = self._read_recommendation(recommendation_id)
+        if recommendation is None or not 1 <= week <= recommendation.total_weeks:
+            return None
+
+        title = recommendation.title
+        with stage_timer("recommend", "week_fetch"):
+            program = self._program(title)
+            if program is None:
+                return None
+            days = self._week_days(title, week)
+        if week < recommendation.total_weeks:
+            self._prefetch_week(title, week + 1)
+
+        return ProgramWeek(
+            recommendation_id=recommendation_id,
+            week=week,
+            total_weeks=recommendation.total_weeks,
+            schedule=self._build_schedule(program, recommendation.difficulty, days)
+        )
+
+    def _program(self, title):
+        """
+        The catalog row of the program with exactly this title, or None.
+        Looked up by title rather than position so ids outlive catalog rebuilds.
+        """
+        if self.catalog is None:
+            return None
+        for idx in self.catalog.find_title(title):
+            if self.catalog.title(idx) == title:
+                return self.catalog.program(idx)
+        return None
+
+    def _week_days(self, title, week):
+        # Concurrent requests for the same week (including a running prefetch)
+        # share a single load
+        future, created = self.weeks.get_or_create((title, week), Future)
+        if created:
+            self._load_week(future, title, week)
+        return future.result()
 
+    def _prefetch_week(self, title, week):
+        future, created = self.weeks.get_or_create((title, week), Future)
+        if created:
+            self._prefetcher.submit(self._load_week, future, title, week)
+
+    def _cache_week(self, title, week, days):
+        future = Future()
+        future.set_result(days)
+        self.weeks.put((title, week), future)
+
+    def _load_week(self, future, title, week):
+        try:
+            future.set_result(self._fetch_program_days([title], week).get(title, []))
         except Exception as e:
-            print(f"Prediction error: {e}")
-            return self._generate_fallback_plan(profile)
+            logger.error(f"Error loading week {week} of '{title}': {e}")
+            # Forget the failure so the next request retries
+            self.weeks.pop((title, week))
+            future.set_exception(e)
+
+    def _fetch_program_days(self, titles, week=1):
+        """
+        Loads one week of every given program in one query.
+        Returns {title: [(day_num, description, exercises), ...]}.
+        """
+        titles = list(titles)
+        if not titles:
+            return {}
 
-    def _generate_plan_from_program(self, program, profile):
-        title = program['title']
-        description = program['description']
-        
-        # Fetch details from DB
         conn = sqlite3.connect(DB_PATH)
-        # Get first week's schedule
-        query = "SELECT * FROM program_details WHERE title = ? AND week = 1 ORDER BY day"
-        df_details = pd.read_sql(query, conn, params=(title,))
+        placeholders = ", ".join("?" * len(titles))
+        query = f"SELECT * FROM program_details WHERE title IN ({placeholders}) AND week = ? ORDER BY day"
+        df_details = pd.read_sql(query, conn, params=(*titles, week))
         conn.close()
-        
+
+        return {title: self._build_program_days(group) for title, group in df_details.groupby('title')}
+
+    def _fetch_total_weeks(self, titles):
+        """
+        Returns {title: number of weeks in program_details}.
+        """
+        titles = list(titles)
+        if not titles:
+            return {}
+
+        conn = sqlite3.connect(DB_PATH)
+        placeholders = ", ".join("?" * len(titles))
+        rows = conn.execute(
+            f"SELECT title, MAX(week) FROM program_details WHERE title IN ({placeholders}) GROUP BY title",
+            tuple(titles)
+        ).fetchall()
+        conn.close()
+
+        return {title: max(1, int(weeks)) for title, weeks in rows if weeks is not None}
+
+    def _build_program_days(self, df_details):
         # Exercise image mapping (placeholders/public GIFs)
         # Exercise image mapping (Static Gym Photos)
         # Using a sleek gym aesthetic photo for all exercises as requested
@@ -209,34 +550,42 @@ class RecommenderEngine:
                     return url
             return "https://images.unsplash.com/photo-1534438327276-14e5300c3a48?auto=format&fit=crop&w=1200&q=80" # Default
 
-        schedule = []
-        if not df_details.empty:
-            # Group by day
-            for day_num, group in df_details.groupby('day'):
-                # Construct description from exercises
-                exercises_desc = []
-                workout_exercises = []
-                
-                for _, row in group.iterrows():
-                    ex_name = row['exercise_name']
-                    sets = str(row['sets'])
-                    reps = str(row['reps'])
-                    intensity = row['intensity'] if pd.notnull(row['intensity']) else None
-                    
-                    exercises_desc.append(f"{ex_name} ({sets}x{reps})")
-                    
-                    workout_exercises.append(Exercise(
-                        name=ex_name,
-                        sets=sets,
-                        reps=reps,
-                        intensity=str(intensity) if intensity else None,
-                        image_url=get_exercise_image(ex_name)
-                    ))
+        days = []
+        # Group by day
+        for day_num, group in df_details.groupby('day'):
+            # Construct description from exercises
+            exercises_desc = []
+            workout_exercises = []
+            
+            for _, row in group.iterrows():
+                ex_name = row['exercise_name']
+                sets = str(row['sets'])
+                reps = str(row['reps'])
+                intensity = row['intensity'] if pd.notnull(row['intensity']) else None
                 
-                desc_str = ", ".join(exercises_desc[:5]) # Limit to 5 for brevity
-                if len(exercises_desc) > 5:
-                    desc_str += f", +{len(exercises_desc)-5} more"
+                exercises_desc.append(f"{ex_name} ({sets}x{reps})")
                 
+                workout_exercises.append(Exercise(
+                    name=ex_name,
+                    sets=sets,
+                    reps=reps,
+                    intensity=str(intensity) if intensity else None,
+                    image_url=get_exercise_image(ex_name)
+                ))
+            
+            desc_str = ", ".join(exercises_desc[:5]) # Limit to 5 for brevity
+            if len(exercises_desc) > 5:
+                desc_str += f", +{len(exercises_desc)-5} more"
+
+            days.append((day_num, desc_str, workout_exercises))
+
+        return days
+
+    def _build_schedule(self, program, difficulty, days):
+        title = program['title']
+        schedule = []
+        if days:
+            for day_num, desc_str, workout_exercises in days:
                 # Map day number to name
                 day_names = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
                 day_idx = (int(day_num) - 1) % 7
@@ -247,7 +596,7 @@ class RecommenderEngine:
                     name=f"Day {int(day_num)}: {title[:20]}...",
                     description=desc_str,
                     duration_minutes=int(program['time_per_workout']) if pd.notnull(program['time_per_workout']) else 60,
-                    difficulty=profile.fitness_level.value,
+                    difficulty=difficulty,
                     day=day_name,
                     image_url="https://images.unsplash.com/photo-1517836357463-d25dfeac3438?auto=format&fit=crop&w=800&q=80", # Placeholder
                     exercises=workout_exercises
@@ -257,24 +606,41 @@ class RecommenderEngine:
              schedule.append(Workout(
                 id=str(uuid.uuid4()),
                 name=title,
-                description=description,
+                description=program['description'],
                 duration_minutes=60,
-                difficulty=profile.fitness_level.value,
+                difficulty=difficulty,
                 day="Monday",
                 image_url="https://images.unsplash.com/photo-1517836357463-d25dfeac3438?auto=format&fit=crop&w=800&q=80"
             ))
+        return schedule
 
+    def _generate_plan_from_program(self, program, profile, days=None, alternatives=None, total_weeks=None):
+        title = program['title']
+        description = program['description']
+        
+        # Fetch details from DB (first week's schedule) unless already loaded
+        if days is None:
+            days = self._fetch_program_days([title]).get(title, [])
+        if total_weeks is None:
+            total_weeks = self._fetch_total_weeks([title]).get(title, 1)
+
+        difficulty = profile.fitness_level.value
         return WeeklyPlan(
-            recommendation_id=str(uuid.uuid4()),
+            # Carries what is needed to page through the remaining weeks
+            recommendation_id=self._sign_recommendation(Recommendation(title, difficulty, total_weeks)),
             user_goal=profile.goal.value,
-            schedule=schedule,
-            advice=f"Based on your goal of {profile.goal.value}, we recommend: {title}. {description[:100]}..."
+            schedule=self._build_schedule(program, difficulty, days),
+            advice=f"Based on your goal of {profile.goal.value}, we recommend: {title}. {description[:100]}...",
+            alternatives=alternatives or [],
+            week=1,
+            total_weeks=total_weeks
         )
 
     def _generate_fallback_plan(self, profile):
         # ... (Keep existing fallback logic or simplified version)
         schedule = [
             Workout(
+                id=str(uuid.uuid4()),
                 name="Full Body Strength",
                 description="Squat, Pushup, Row",
                 duration_minutes=45,
@@ -283,6 +649,7 @@ class RecommenderEngine:
                 image_url="https://images.unsplash.com/photo-1517836357463-d25dfeac3438?auto=format&fit=crop&w=800&q=80"
             ),
              Workout(
+                id=str(uuid.uuid4()),
                 name="Cardio",
                 description="30 mins Jog",
                 duration_minutes=30,
@@ -0,0 +1,98 @@
+import os
+import random
+import sqlite3
+import argparse
+from context_builder import build_abstracts, build_exercise_table
+
+# Same tag vocabularies as the Boostcamp program summary
+LEVELS = ['Beginner', 'Novice', 'Intermediate', 'Advanced']
+GOALS = ['Fat Loss', 'Cardio', 'Athletics', 'Bodybuilding', 'Muscle & Sculpting', 'Powerbuilding',
+         'Hypertrophy', 'Yoga', 'Mobility', 'Powerlifting', 'Olympic Weightlifting', 'Bodyweight Fitness']
+EQUIPMENT = ['Full Gym', 'Garage Gym', 'Dumbbell Only', 'At Home']
+
+# Title stems include the recommender's workout types, so NN predictions find matches
+TITLE_STEMS = ['Cardio & Light Strength', 'Full Body Strength', 'Couch to 5k', 'Yoga for Beginners',
+               'HIIT & Cardio', 'Upper/Lower Split', '10k Training', 'Power Yoga',
+               'Advanced HIIT & MetCon', 'Push/Pull/Legs', 'Marathon Prep', 'Advanced Mobility',
+               'Strength Builder', 'Hypertrophy Block', 'Athlete Program']
+
+EXERCISES = ['Back Squat', 'Front Squat', 'Bench Press', 'Incline Dumbbell Press', 'Deadlift',
+             'Romanian Deadlift', 'Barbell Row', 'Pull Up', 'Push Up', 'Overhead Press', 'Walking Lunge',
+             'Bicep Curl', 'Tricep Pushdown', 'Plank', 'Running', 'Rowing Machine', 'Sun Salutation',
+             'Hip Flexor Stretch', 'Kettlebell Swing', 'Box Jump']
+
+WORDS = ['build', 'strength', 'endurance', 'progressive', 'overload', 'weekly', 'volume', 'intensity',
+         'recovery', 'conditioning', 'technique', 'mobility', 'power', 'athletic', 'performance']
+
+SUMMARY_COLUMNS = ['title', 'description', 'level', 'goal', 'equipment', 'program_length',
+                   'time_per_workout', 'total_exercises', 'created', 'last_edit']
+DETAIL_COLUMNS = ['title', 'description', 'level', 'goal', 'equipment', 'program_length',
+                  'time_per_workout', 'week', 'day', 'number_of_exercises', 'exercise_name',
+                  'sets', 'reps', 'intensity', 'created', 'last_edit']
+
+def _description(rng, min_words=20, max_words=400):
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(min_words, max_words))).capitalize() + "."
+
+def generate(db_path, programs=2600, weeks=8, days=4, exercises=6, seed=0):
+    """
+    Writes a synthetic workout.db with the tables, indices and retrieval tables init_db.py
+    produces from the Boostcamp CSVs.
+    Rows in program_details: programs * weeks * days * exercises.
+    """
+    rng = random.Random(seed)
+    if os.path.exists(db_path):
+        os.remove(db_path)
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+
+    cursor.execute("CREATE TABLE programs (title TEXT, description TEXT, level TEXT, goal TEXT, equipment TEXT, "
+                   "program_length REAL, time_per_workout REAL, total_exercises INTEGER, created TEXT, last_edit TEXT)")
+    cursor.execute("CREATE TABLE program_details (title TEXT, description TEXT, level TEXT, goal TEXT, equipment TEXT, "
+                   "program_length REAL, time_per_workout REAL, week REAL, day REAL, number_of_exercises INTEGER, "
+                   "exercise_name TEXT, sets REAL, reps REAL, intensity REAL, created TEXT, last_edit TEXT)")
+
+    for i in range(programs):
+        title = f"{rng.choice(TITLE_STEMS)} {i + 1}"
+        description = _description(rng)
+        level = str(rng.sample(LEVELS, rng.randint(1, 2)))
+        goal = str(rng.sample(GOALS, rng.randint(1, 3)))
+        equipment = rng.choice(EQUIPMENT)
+        time_per_workout = float(rng.choice([30, 45, 60, 75, 90]))
+        created = last_edit = "2023-01-01 00:00:00"
+
+        cursor.execute(
+            f"INSERT INTO programs VALUES ({', '.join('?' * len(SUMMARY_COLUMNS))})",
+            (title, description, level, goal, equipment, float(weeks), time_per_workout,
+             days * exercises, created, last_edit)
+        )
+
+        day_exercises = [rng.sample(EXERCISES, exercises) for _ in range(days)]
+        rows = []
+        for week in range(1, weeks + 1):
+            for day in range(1, days + 1):
+                for name in day_exercises[day - 1]:
+                    intensity = float(rng.randint(6, 9)) if rng.random() < 0.5 else None
+                    rows.append((title, description, level, goal, equipment, float(weeks), time_per_workout,
+                                 float(week), float(day), exercises, name, float(rng.choice([3, 4, 5])),
+                                 float(rng.choice([5, 8, 10, 12])), intensity, created, last_edit))
+        cursor.executemany(f"INSERT INTO program_details VALUES ({', '.join('?' * len(DETAIL_COLUMNS))})", rows)
+
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_programs_title ON programs(title)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_details_title ON program_details(title)")
+    conn.commit()
+    build_abstracts(conn)
+    build_exercise_table(conn)
+    conn.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic workout.db for load testing.")
+    parser.add_argument("--out", required=True, help="Path of the database to write (replaced if it exists)")
+    parser.add_argument("--programs", type=int, default=2600)
+    parser.add_argument("--weeks", type=int, default=8)
+    parser.add_argument("--days", type=int, default=4)
+    parser.add_argument("--exercises", type=int, default=6)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    generate(args.out, args.programs, args.weeks, args.days, args.exercises, args.seed)
+    print(f"Synthetic database with {args.programs} programs written to {args.out}")
@@ -1,85 +1,256 @@
 import os
+import time
+import argparse
 import pandas as pd
 import numpy as np
 import pickle
+import tempfile
 import tensorflow as tf
-from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import LabelEncoder
 from tensorflow.keras.models import Sequential
-from tensorflow.keras.layers import Dense, Dropout
+from tensorflow.keras.layers import Dense, Dropout, Embedding, Flatten, Activation
+from model_registry import publish
 
 # Paths
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DATA_PATH = os.path.join(BASE_DIR, "backend", "data", "workout_data.csv")
-MODEL_PATH = os.path.join(BASE_DIR, "workout_model.h5")
-ENCODER_PATH = os.path.join(BASE_DIR, "encoders.pkl")
 
-def train_model():
-    print("Loading data...")
-    if not os.path.exists(DATA_PATH):
-        print(f"Error: Data file not found at {DATA_PATH}")
-        return
+FEATURES = ['fitness_level', 'goal']
+TARGET = 'workout_type'
+
+# Held-out split, shared by every mode so their accuracies are comparable
+TEST_FRACTION = 0.2
+SEED = 42
+
+# Rows read per chunk when streaming the data
+CHUNK_SIZE = 100_000
+
+# Full-batch gradient steps (and learning rate) for the weighted mode
+WEIGHTED_STEPS = 300
+WEIGHTED_LEARNING_RATE = 0.01
+
+MODES = ['full', 'weighted', 'exact']
+
+def iter_chunks(path, chunksize=CHUNK_SIZE):
+    """
+    Streams the CSV in chunks, yielding (chunk, test_mask).
+    The mask comes from one seeded generator, so the split is the same for
+    every mode and independent of the chunk size.
+    """
+    rng = np.random.default_rng(SEED)
+    for chunk in pd.read_csv(path, usecols=FEATURES + [TARGET], chunksize=chunksize):
+        yield chunk, rng.random(len(chunk)) < TEST_FRACTION
+
+def aggregate_counts(path, chunksize=CHUNK_SIZE):
+    """
+    Collapses the data into row counts per (split, fitness_level, goal, workout_type)
+    without holding more than one chunk in memory.
+    """
+    counts = None
+    for chunk, test_mask in iter_chunks(path, chunksize):
+        chunk = chunk.assign(split=np.where(test_mask, 'test', 'train'))
+        part = chunk.groupby(['split'] + FEATURES + [TARGET]).size()
+        counts = part if counts is None else counts.add(part, fill_value=0)
+    return counts.astype(np.int64)
+
+def fit_encoders(counts):
+    """
+    LabelEncoders over the values seen in the data (same classes as fitting
+    on the raw columns, since LabelEncoder sorts its classes).
+    """
+    encoders = {}
+    for key, column in [("fitness", 'fitness_level'), ("goal", 'goal'), ("target", TARGET)]:
+        encoders[key] = LabelEncoder().fit(counts.index.get_level_values(column).unique())
+    return encoders
+
+def encode_counts(counts, encoders, split):
+    """
+    Returns (X, y, weights) for one split: one row per distinct
+    (features -> target) combination, weighted by how often it occurs.
+    """
+    part = counts.loc[split].reset_index(name='count')
+    X = np.column_stack([
+        encoders['fitness'].transform(part['fitness_level']),
+        encoders['goal'].transform(part['goal']),
+    ])
+    y = encoders['target'].transform(part[TARGET])
+    return X, y, part['count'].to_numpy()
+
+def evaluate(model, X_test, y_test, w_test):
+    """
+    Accuracy over the test rows, computed from their distinct combinations.
+    """
+    predicted = np.argmax(model.predict(X_test, verbose=0), axis=1)
+    return float(np.sum(w_test * (predicted == y_test)) / np.sum(w_test))
 
-    df = pd.read_csv(DATA_PATH)
-    
-    # Preprocessing
-    print("Preprocessing data...")
-    le_fitness = LabelEncoder()
-    le_goal = LabelEncoder()
-    le_target = LabelEncoder()
-    
-    df['fitness_level_encoded'] = le_fitness.fit_transform(df['fitness_level'])
-    df['goal_encoded'] = le_goal.fit_transform(df['goal'])
-    df['workout_type_encoded'] = le_target.fit_transform(df['workout_type'])
-    
-    # Features and Target
-    X = df[['fitness_level_encoded', 'goal_encoded']].values
-    y = df['workout_type_encoded'].values
-    
-    # Split
-    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
-    
+def build_mlp(num_classes, optimizer='adam'):
     # Model Architecture
-    print("Building model...")
     model = Sequential([
         Dense(64, activation='relu', input_shape=(2,)),
         Dropout(0.2),
         Dense(32, activation='relu'),
-        Dense(len(le_target.classes_), activation='softmax')
+        Dense(num_classes, activation='softmax')
     ])
-    
-    model.compile(optimizer='adam',
+
+    model.compile(optimizer=optimizer,
                   loss='sparse_categorical_crossentropy',
                   metrics=['accuracy'])
-    
-    # Training
-    print("Starting training...")
-    history = model.fit(X_train, y_train, 
-                        epochs=50, 
-                        batch_size=32, 
-                        validation_data=(X_test, y_test),
-                        verbose=1)
-    
-    # Evaluation
-    loss, accuracy = model.evaluate(X_test, y_test, verbose=0)
+    return model
+
+def train_full(path, encoders, num_classes):
+    """
+    Original path: every row, 50 epochs of mini-batches.
+    """
+    chunks = list(iter_chunks(path))
+    df = pd.concat([chunk for chunk, _ in chunks], ignore_index=True)
+    test_mask = np.concatenate([mask for _, mask in chunks])
+
+    X = np.column_stack([
+        encoders['fitness'].transform(df['fitness_level']),
+        encoders['goal'].transform(df['goal']),
+    ])
+    y = encoders['target'].transform(df[TARGET])
+
+    model = build_mlp(num_classes)
+    model.fit(X[~test_mask], y[~test_mask],
+              epochs=50,
+              batch_size=32,
+              validation_data=(X[test_mask], y[test_mask]),
+              verbose=1)
+    return model
+
+def train_weighted(X_train, y_train, w_train, num_classes):
+    """
+    Same network, trained on the distinct combinations with sample weights.
+    Every step is a full batch over a handful of rows, run as a single epoch
+    so Keras' per-epoch overhead is paid once.
+    """
+    model = build_mlp(num_classes, tf.keras.optimizers.Adam(learning_rate=WEIGHTED_LEARNING_RATE))
+    weights = (w_train / w_train.mean()).astype(np.float32)
+    batch = tf.data.Dataset.from_tensors((X_train.astype(np.float32), y_train, weights))
+    model.fit(batch.repeat(WEIGHTED_STEPS), epochs=1, verbose=0)
+    return model
+
+def train_exact(X_train, y_train, w_train, encoders):
+    """
+    No gradient descent: the empirical distribution of workout types for each
+    (fitness_level, goal), whose argmax is the best any model on these two
+    features can do. It is packed into a Keras model so the server loads it
+    like any other version: a fixed Dense layer maps the encoded pair to a
+    single index, and an Embedding holds the log-probabilities for that index.
+    """
+    num_fitness = len(encoders['fitness'].classes_)
+    num_goal = len(encoders['goal'].classes_)
+    num_classes = len(encoders['target'].classes_)
+
+    table = np.zeros((num_fitness * num_goal, num_classes))
+    np.add.at(table, (X_train[:, 0] * num_goal + X_train[:, 1], y_train), w_train)
+    # Unseen combinations get a uniform distribution
+    table += 1e-6
+    table /= table.sum(axis=1, keepdims=True)
+
+    model = Sequential([
+        Dense(1, use_bias=False, trainable=False, input_shape=(2,)),
+        Embedding(num_fitness * num_goal, num_classes, trainable=False),
+        Flatten(),
+        Activation('softmax')
+    ])
+    model.layers[0].set_weights([np.array([[num_goal], [1]], dtype=np.float32)])
+    model.layers[1].set_weights([np.log(table).astype(np.float32)])
+    model.compile(optimizer='adam', loss='sparse_categorical_crossentropy')
+    return model
+
+def run_mode(mode, path=DATA_PATH):
+    """
+    Trains one mode and returns (model, encoders, report).
+    """
+    start = time.perf_counter()
+    counts = aggregate_counts(path)
+    encoders = fit_encoders(counts)
+    X_train, y_train, w_train = encode_counts(counts, encoders, 'train')
+    X_test, y_test, w_test = encode_counts(counts, encoders, 'test')
+    prep_seconds = time.perf_counter() - start
+
+    num_classes = len(encoders['target'].classes_)
+    start = time.perf_counter()
+    if mode == 'full':
+        model = train_full(path, encoders, num_classes)
+    elif mode == 'weighted':
+        model = train_weighted(X_train, y_train, w_train, num_classes)
+    else:
+        model = train_exact(X_train, y_train, w_train, encoders)
+    train_seconds = time.perf_counter() - start
+
+    report = {
+        "mode": mode,
+        "train_rows": int(w_train.sum()),
+        "distinct_rows": len(X_train),
+        "prep_seconds": round(prep_seconds, 3),
+        "train_seconds": round(train_seconds, 3),
+        "test_accuracy": evaluate(model, X_test, y_test, w_test),
+    }
+    return model, encoders, report
+
+def print_reports(reports):
+    print(f"\n{'mode':<10}{'rows':>10}{'distinct':>10}{'prep s':>10}{'train s':>10}{'accuracy':>10}")
+    for r in reports:
+        print(f"{r['mode']:<10}{r['train_rows']:>10}{r['distinct_rows']:>10}{r['prep_seconds']:>10.3f}"
+              f"{r['train_seconds']:>10.3f}{r['test_accuracy']*100:>9.2f}%")
+
+def train_model(mode='full', path=DATA_PATH, publish_model=True):
+    print("Loading data...")
+    if not os.path.exists(path):
+        print(f"Error: Data file not found at {path}")
+        return
+
+    print(f"Training in '{mode}' mode...")
+    model, encoders, report = run_mode(mode, path)
+
     print(f"\nTraining Complete!")
-    print(f"Final Test Accuracy: {accuracy*100:.2f}%")
-    
+    print_reports([report])
+
+    if not publish_model:
+        return report
+
     # Save Artifacts
     print("Saving model and encoders...")
-    model.save(MODEL_PATH)
-    
-    encoders = {
-        "fitness": le_fitness,
-        "goal": le_goal,
-        "target": le_target
-    }
-    
-    with open(ENCODER_PATH, "wb") as f:
-        pickle.dump(encoders, f)
-        
-    print(f"Model saved to {MODEL_PATH}")
-    print(f"Encoders saved to {ENCODER_PATH}")
+
+    # Publish model and encoders together as a new registry version;
+    # running servers pick it up without a restart
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        model_path = os.path.join(tmp_dir, "workout_model.h5")
+        encoder_path = os.path.join(tmp_dir, "encoders.pkl")
+        model.save(model_path)
+        with open(encoder_path, "wb") as f:
+            pickle.dump(encoders, f)
+        version = publish(model_path, encoder_path, report)
+
+    print(f"Published model version {version}")
+    return report
+
+def compare_modes(path=DATA_PATH):
+    """
+    Trains every mode on the same split and prints time and accuracy side by side.
+    Nothing is published.
+    """
+    reports = []
+    for mode in MODES:
+        print(f"Training in '{mode}' mode...")
+        _, _, report = run_mode(mode, path)
+        reports.append(report)
+    print_reports(reports)
+    return reports
 
 if __name__ == "__main__":
-    train_model()
+    parser = argparse.ArgumentParser(description="Train the workout recommender and publish it to the model registry.")
+    parser.add_argument("--mode", choices=MODES + ['compare'], default='full',
+                        help="full: original per-row training; weighted: deduplicated rows with sample weights; "
+                             "exact: conditional argmax table; compare: run all and report, without publishing")
+    parser.add_argument("--data", default=DATA_PATH, help="CSV with fitness_level, goal and workout_type columns")
+    parser.add_argument("--no-publish", action="store_true", help="Train and report without publishing")
+    args = parser.parse_args()
+
+    if args.mode == 'compare':
+        compare_modes(args.data)
+    else:
+        train_model(args.mode, args.data, publish_model=not args.no_publish)
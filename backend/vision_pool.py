@@ -0,0 +1,304 @@
+import time
+import zlib
+import asyncio
+import logging
+import threading
+import multiprocessing as mp
+from multiprocessing import shared_memory
+from vision_engine import VisionEngine
+from metrics import stage_timer, capture_observations, record_observations, VISION_FRAMES
+
+logger = logging.getLogger(__name__)
+
+# Per-worker ring buffer: SLOTS frames of up to SLOT_SIZE bytes each
+SLOTS = 8
+SLOT_SIZE = 1024 * 1024
+
+# Minimum delay between restarts of the same worker, to avoid crash loops
+RESTART_BACKOFF = 1.0
+
+# Seconds to wait for a frame's result; a ready worker that takes longer is
+# considered hung and is killed, so it gets restarted
+FRAME_TIMEOUT = 5.0
+
+def _shard(session_id, num_workers):
+    return zlib.crc32(session_id.encode("utf-8")) % num_workers
+
+def _set_result(future, result):
+    if not future.done():
+        future.set_result(result)
+
+def _resolve(future, loop, result):
+    try:
+        loop.call_soon_threadsafe(_set_result, future, result)
+    except RuntimeError:
+        pass # Loop already closed
+
+def _worker_main(conn, shm_name, slot_size):
+    """
+    Worker process loop. Holds one pose model, shared by one VisionEngine
+    per session (each engine keeps its own rep-counting state).
+    Requests arrive on conn; frame bytes are read from the shared-memory ring.
+    """
+    shm = shared_memory.SharedMemory(name=shm_name)
+    model = VisionEngine().model
+    sessions = {}
+    # Frame timeouts only apply once the model is loaded
+    conn.send(("ready", None, None, None, []))
+
+    def session(session_id):
+        if session_id not in sessions:
+            sessions[session_id] = VisionEngine(model=model)
+        return sessions[session_id]
+
+    try:
+        while True:
+            try:
+                msg = conn.recv()
+            except EOFError:
+                break
+            if msg is None:
+                break
+
+            op, session_id = msg[0], msg[1]
+            if op == "exercise":
+                try:
+                    session(session_id).reset_state(msg[2])
+                except Exception as e:
+                    logger.error(f"Error setting exercise: {e}")
+            elif op == "close":
+                sessions.pop(session_id, None)
+            elif op == "frame":
+                slot, length = msg[2], msg[3]
+                start = slot * slot_size
+                frame = shm.buf[start:start + length]
+                # Stage timings and frame outcomes go back with the result,
+                # so they show up in the API process' /metrics
+                with capture_observations() as observations:
+                    try:
+                        result = session(session_id).process_frame(frame)
+                    except Exception as e:
+                        logger.error(f"Error processing frame: {e}")
+                        VISION_FRAMES.inc(result="error")
+                        result = None
+                    finally:
+                        frame.release()
+                conn.send(("frame", session_id, slot, result, observations))
+    finally:
+        shm.close()
+
+class _Worker:
+    def __init__(self, index, ctx):
+        self.index = index
+        self.ctx = ctx
+        self.shm = shared_memory.SharedMemory(create=True, size=SLOTS * SLOT_SIZE)
+        self.lock = threading.Lock()
+        self.process = None
+        self.conn = None
+        self.free_slots = list(range(SLOTS))
+        self.pending = {} # slot -> (future, loop)
+        self.started_at = 0.0
+        self.ready = False
+
+    def spawn(self):
+        parent_conn, child_conn = self.ctx.Pipe()
+        self.process = self.ctx.Process(
+            target=_worker_main,
+            args=(child_conn, self.shm.name, SLOT_SIZE),
+            name=f"vision-worker-{self.index}",
+            daemon=True
+        )
+        self.process.start()
+        # Close our copy of the child's end, so recv() sees EOF if the child dies
+        child_conn.close()
+        self.conn = parent_conn
+        self.started_at = time.monotonic()
+        self.ready = False
+
+    def send(self, msg):
+        with self.lock:
+            self.conn.send(msg)
+
+class VisionPool:
+    """
+    Fleet of worker processes, each running its own pose model.
+    Sessions are sharded across workers by session id; frames travel through a
+    per-worker shared-memory ring and results come back over a pipe.
+    A worker that dies is restarted; only its in-flight frames are lost, and
+    its sessions' exercises are replayed (rep counts restart from zero).
+    """
+    def __init__(self, num_workers):
+        self.num_workers = num_workers
+        self.workers = []
+        self.session_exercise = {} # session_id -> exercise, replayed after a restart
+        self._closing = False
+
+    def start(self):
+        ctx = mp.get_context("spawn")
+        for index in range(self.num_workers):
+            worker = _Worker(index, ctx)
+            worker.spawn()
+            self.workers.append(worker)
+            threading.Thread(target=self._read_results, args=(worker,), name=f"vision-results-{index}", daemon=True).start()
+        logger.info(f"Vision pool started with {self.num_workers} workers.")
+
+    def stop(self):
+        self._closing = True
+        for worker in self.workers:
+            try:
+                worker.send(None)
+            except (OSError, ValueError):
+                pass
+        for worker in self.workers:
+            worker.process.join(timeout=5)
+            if worker.process.is_alive():
+                worker.process.kill()
+            self._fail_pending(worker)
+            worker.shm.close()
+            worker.shm.unlink()
+
+    def _worker_for(self, session_id):
+        return self.workers[_shard(session_id, self.num_workers)]
+
+    def set_exercise(self, session_id, exercise):
+        self.session_exercise[session_id] = exercise
+        try:
+            self._worker_for(session_id).send(("exercise", session_id, exercise))
+        except (OSError, ValueError):
+            pass # Worker is restarting; the exercise is replayed once it is back
+
+    def close_session(self, session_id):
+        self.session_exercise.pop(session_id, None)
+        try:
+            self._worker_for(session_id).send(("close", session_id))
+        except (OSError, ValueError):
+            pass
+
+    async def process_frame(self, session_id, frame_bytes):
+        """
+        Returns the worker's result for one frame, or None if the frame was
+        dropped (ring full, frame too large, worker crashed or timed out).
+        """
+        if len(frame_bytes) > SLOT_SIZE:
+            VISION_FRAMES.inc(result="oversized")
+            return None
+
+        worker = self._worker_for(session_id)
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        with worker.lock:
+            if not worker.free_slots:
+                # Worker is behind; dropping a live frame beats queueing it
+                VISION_FRAMES.inc(result="dropped")
+                return None
+            slot = worker.free_slots.pop()
+            process = worker.process
+            start = slot * SLOT_SIZE
+            worker.shm.buf[start:start + len(frame_bytes)] = frame_bytes
+            worker.pending[slot] = (future, loop)
+            try:
+                worker.conn.send(("frame", session_id, slot, len(frame_bytes)))
+            except (OSError, ValueError):
+                del worker.pending[slot]
+                worker.free_slots.append(slot)
+                return None
+
+        try:
+            with stage_timer("vision", "pool_roundtrip"):
+                return await asyncio.wait_for(future, FRAME_TIMEOUT)
+        except asyncio.TimeoutError:
+            self._frame_timed_out(worker, process, slot, future)
+            return None
+
+    def _frame_timed_out(self, worker, process, slot, future):
+        VISION_FRAMES.inc(result="timeout")
+        with worker.lock:
+            # Forget the frame; its slot is freed by a late result or by the restart
+            if worker.pending.get(slot, (None,))[0] is future:
+                del worker.pending[slot]
+            hung = worker.process is process and worker.ready and process.is_alive()
+        if hung:
+            # The result reader sees EOF and restarts the worker, failing its
+            # other pending frames and replaying its sessions' exercises
+            logger.warning(f"Vision worker {worker.index} timed out on a frame; killing it.")
+            process.kill()
+
+    def _read_results(self, worker):
+        while not self._closing:
+            try:
+                op, session_id, slot, result, observations = worker.conn.recv()
+            except (EOFError, OSError):
+                if self._closing:
+                    break
+                self._restart(worker)
+                continue
+
+            if op == "ready":
+                worker.ready = True
+                continue
+
+            record_observations(observations)
+            with worker.lock:
+                entry = worker.pending.pop(slot, None)
+                worker.free_slots.append(slot)
+            if entry is not None:
+                future, loop = entry
+                _resolve(future, loop, result)
+
+    def _fail_pending(self, worker):
+        with worker.lock:
+            pending = list(worker.pending.values())
+            worker.pending.clear()
+            worker.free_slots = list(range(SLOTS))
+        for future, loop in pending:
+            _resolve(future, loop, None)
+
+    def _restart(self, worker):
+        worker.process.join(timeout=1)
+        logger.warning(f"Vision worker {worker.index} exited (code {worker.process.exitcode}); restarting.")
+        self._fail_pending(worker)
+
+        wait = RESTART_BACKOFF - (time.monotonic() - worker.started_at)
+        if wait > 0:
+            time.sleep(wait)
+
+        with worker.lock:
+            worker.conn.close()
+            worker.spawn()
+
+        for session_id, exercise in list(self.session_exercise.items()):
+            if self._worker_for(session_id) is worker:
+                try:
+                    worker.send(("exercise", session_id, exercise))
+                except (OSError, ValueError):
+                    pass
+
+class LocalVision:
+    """
+    In-process stand-in for VisionPool (VISION_WORKERS=0): one shared pose
+    model with a VisionEngine per session, run on the event loop.
+    """
+    def __init__(self):
+        self.model = None
+        self.sessions = {}
+
+    def start(self):
+        self.model = VisionEngine().model
+
+    def stop(self):
+        self.sessions.clear()
+
+    def _session(self, session_id):
+        if session_id not in self.sessions:
+            self.sessions[session_id] = VisionEngine(model=self.model)
+        return self.sessions[session_id]
+
+    def set_exercise(self, session_id, exercise):
+        self._session(session_id).reset_state(exercise)
+
+    def close_session(self, session_id):
+        self.sessions.pop(session_id, None)
+
+    async def process_frame(self, session_id, frame_bytes):
+        return self._session(session_id).process_frame(frame_bytes)